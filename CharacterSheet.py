@@ -1,21 +1,12 @@
+from collections import namedtuple
 from dataclasses import dataclass, field as dataclass_field
+import functools
 import io
-import pdfrw
+import typing
 from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
-
-def merge(overlay_canvas: io.BytesIO, template_path: str) -> io.BytesIO:
-    template_pdf = pdfrw.PdfReader(template_path)
-    overlay_pdf = pdfrw.PdfReader(overlay_canvas)
-    for page, data in zip(template_pdf.pages, overlay_pdf.pages):
-        overlay = pdfrw.PageMerge().add(data)[0]
-        pdfrw.PageMerge(page).add(overlay).render()
-    form = io.BytesIO()
-    pdfrw.PdfWriter().write(form, template_pdf)
-    form.seek(0)
-    return form
+from fonts import DEFAULT_FONT, font_registry
+from instrumentation import CountingSink, print_stage, render_hooks
+from templates import merge_to, replacing_file
 
 
 @dataclass
@@ -26,9 +17,13 @@ class Value:
     explaination: str = ""  # Why this field has this value
     english_name: str = ""  # Name translated into English
 
+    @staticmethod
+    def represent(value):
+        return str(value)
+
     @property
     def repr_value(self):
-        return str(self.value)
+        return self.represent(self.value)
 
 
 class IntegerValue(Value):
@@ -36,13 +31,13 @@ class IntegerValue(Value):
 
 
 class IntegerValueWithSign(IntegerValue):
-    @property
-    def repr_value(self):
-        if int(self.value) > 0:
-            return '+' + str(int(self.value))
-        if int(self.value) < 0:
-            return str(int(self.value))
-        return self.value
+    @staticmethod
+    def represent(value):
+        if int(value) > 0:
+            return '+' + str(int(value))
+        if int(value) < 0:
+            return str(int(value))
+        return value
 
 
 class StringValue(Value):
@@ -53,75 +48,137 @@ class BooleanValue(Value):
     pass
 
 
-@dataclass
+# what one field draws on the overlay: everything setFont and drawString need, with auto fit and alignment applied
+Fragment = namedtuple('Fragment', ('font_size', 'x', 'y', 'text'))
+
+
+def draw_fragment(pdf, fragment: Fragment):
+    pdf.setFont(DEFAULT_FONT, fragment.font_size)
+    pdf.drawString(
+        x=fragment.x,
+        y=fragment.y,
+        text=fragment.text,
+    )
+
+
+@dataclass(frozen=True)
 class Field:
+    """
+    Where and how a value is printed. Immutable and shared by every sheet with the same layout,
+    the values themselves are kept by CharacterSheet
+    """
+    name: str  # How it is called on PDF page (ex: СПАСБРОСКИ - Сила)
     center_x: int  # x coordinates of center
     center_y: int  # y coordinates of center
     length: int  # to calculate if text fits
     height: int  # row high
     default_font_size: int
-    value: Value = Value('Empty')
+    value_type: typing.Type[Value] = StringValue  # how the value is printed
+    english_name: str = ""  # Name translated into English
     rows_coordinates: tuple = ()  # if more that one row
     alignment: str = 'center'  # left, right or center
     auto_fit_font_size: bool = True  # Should change font size to fit
 
-    def set_value(self, value):
-        self.value.value = value
-
     def calculate_y(self, font_size):
         return self.center_y - font_size // 4
 
-    def calculate_x(self, font_size, string_length):
-        if string_length == 1:
+    def calculate_x(self, font_size, repr_value):
+        if len(repr_value) == 1:
             return self.center_x - font_size // 8
-        return self.center_x - (font_size // 4) * len(str(
-            self.value.repr_value))
-
-    def render(self, pdf):
-        font_size = self.default_font_size
-        if self.value.font_size:
-            font_size = self.value.font_size
-        length_in_coordinates = font_size // 2 * len(str(self.value.repr_value))
+        return self.center_x - (font_size // 4) * len(str(repr_value))
+
+    def fragment(self, value, font_size: int = 0) -> Fragment:
+        repr_value = self.value_type.represent(value)
+        font_size = font_size or self.default_font_size
+        length_in_coordinates = font_size // 2 * len(str(repr_value))
         if length_in_coordinates > self.length and self.auto_fit_font_size:
             font_size = font_size * (self.length / length_in_coordinates)
-        # must have FreeSans.ttf in the same folder
-        pdf.setFont('FreeSans', font_size)
         if self.alignment == 'center':
-            x = self.calculate_x(font_size, len(self.value.repr_value))
+            x = self.calculate_x(font_size, repr_value)
         else:
             x = self.center_x
-        pdf.drawString(
-            x=x,
-            y=self.calculate_y(font_size),
-            text=self.value.repr_value,
-        )
-
-
-class CharacterSheet:
+        return Fragment(font_size=font_size, x=x, y=self.calculate_y(font_size), text=repr_value)
+
+    def render(self, pdf, value, font_size: int = 0):
+        draw_fragment(pdf, self.fragment(value, font_size))
+
+
+class FieldLayout:
+    """
+    Fields of one sheet variant in render order, with a case-insensitive index by Russian and English name
+    """
+    __slots__ = ('fields', 'fields_by_name')
+
+    def __init__(self, fields: typing.Iterable[Field]):
+        self.fields = tuple(fields)
+        self.fields_by_name = {}
+        for position, field in enumerate(self.fields):
+            for name in (field.name, field.english_name):
+                if name:
+                    self.fields_by_name.setdefault(name.lower(), position)  # first match
+
+    def position(self, field_name: str) -> int:
+        try:
+            return self.fields_by_name[field_name.lower()]
+        except KeyError:
+            raise ValueError(f'Field with name "{field_name}" not found') from None
+
+
+# ability, its name on the sheet, name of its modifier, y of the small and the big circle, value type of the
+# ability and the modifier when modifiers are bigger, length of the modifier field
+ABILITY_FIELDS = (
+    ('strength', 'Сила', 'Модификатор силы', 597, 620, StringValue, StringValue, 25),
+    ('dexterity', 'Ловкость', 'Модификатор ловкости', 525, 548, IntegerValue, IntegerValueWithSign, 25),
+    ('constitution', 'Телосложение', 'Модификатор телосложения', 454, 476, IntegerValue, IntegerValueWithSign, 25),
+    ('intelligence', 'Интеллект', 'Модификатор интеллекта', 382, 404, IntegerValue, IntegerValueWithSign, 25),
+    ('wisdom', 'Мудрость', 'Модификатор мудрости', 310, 335, IntegerValue, IntegerValueWithSign, 25),
+    ('charisma', 'Харизма', 'Модификатор Харизмы', 238, 263, IntegerValue, IntegerValueWithSign, 15),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def field_layout(abilities_modifiers_bigger: bool = True) -> FieldLayout:
     # bottom left corner coords are 0, 0
     # upper left corner coords are 0, 790
     # upper righ corner coords are 593 ,790
-    result_file_name: str
-    character_name: Field
-    class_and_level: Field
-    backstory: Field
-    player_name: Field
-    race: Field
-    alignment: Field
-    experience: Field
-    strength: Field
-    strength_modifier: Field
-    dexterity: Field
-    dexterity_modifier: Field
-    constitution: Field
-    constitution_modifier: Field
-    intelligence: Field
-    intelligence_modifier: Field
-    wisdom: Field
-    wisdom_modifier: Field
-    charisma: Field
-    charisma_modifier: Field
-    template_file = 'character_sheet_light.pdf'
+    fields = [
+        Field(name="Имя персонажа", english_name='character_name', default_font_size=20, height=20, length=170,
+              center_x=128, center_y=720),
+        Field(name="КЛАСС И УРОВЕНЬ", english_name='class_and_level', default_font_size=8, height=5, length=80,
+              center_x=310, center_y=735),
+        Field(name="Предыстория", english_name='backstory', default_font_size=8, height=5, length=80,
+              center_x=400, center_y=735),
+        Field(name="Имя игрока", english_name='player_name', default_font_size=8, height=5, length=80,
+              center_x=510, center_y=735),
+        Field(name="Раса", english_name='race', default_font_size=8, height=5, length=80,
+              center_x=310, center_y=708),
+        Field(name="Мировоззрение", english_name='alignment', default_font_size=8, height=5, length=80,
+              center_x=400, center_y=708),
+        Field(name="Опыт", english_name='experience', value_type=IntegerValue, default_font_size=8, height=5,
+              length=80, center_x=510, center_y=708),
+    ]
+    for ability, name, modifier_name, small_y, big_y, ability_type, modifier_type, modifier_length in ABILITY_FIELDS:
+        if not abilities_modifiers_bigger:
+            ability_type, modifier_type = IntegerValue, IntegerValueWithSign
+        fields.append(Field(name=name, english_name=ability, value_type=ability_type,
+                            default_font_size=10 if abilities_modifiers_bigger else 24,
+                            height=5, length=15, center_x=55,
+                            center_y=small_y if abilities_modifiers_bigger else big_y))
+        fields.append(Field(name=modifier_name, english_name=f'{ability}_modifier', value_type=modifier_type,
+                            default_font_size=24 if abilities_modifiers_bigger else 10,
+                            height=5, length=modifier_length, center_x=55,
+                            center_y=big_y if abilities_modifiers_bigger else small_y))
+    return FieldLayout(fields)
+
+
+class CharacterSheet:
+    """
+    Values of one sheet. Geometry and fonts come from the shared FieldLayout, so a sheet holds only
+    its file names and one value and font size per field.
+    Rendering is incremental: the fragment of every field is kept together with the value and font size it was
+    made from and is only recomputed when they change, and the overlay is only redrawn when a fragment changed
+    """
+    __slots__ = ('result_file_name', 'template_file', 'layout', 'values', 'font_sizes', 'fragments', 'overlay')
 
     def __init__(
             self,
@@ -133,374 +190,94 @@ class CharacterSheet:
     ):
         self.result_file_name = result_file_name
         self.template_file = template_file_name
-        self.character_name = Field(
-            value=StringValue("Имя персонажа"),
-            default_font_size=20,
-            alignment='center',
-            auto_fit_font_size=True,
-            height=20,
-            length=170,
-            center_x=128,
-            center_y=720,
-        )
-        self.class_and_level = Field(
-            value=StringValue("КЛАСС И УРОВЕНЬ"),
-            default_font_size=8,
-            alignment='center',
-            auto_fit_font_size=True,
-            height=5,
-            length=80,
-            center_x=310,
-            center_y=735,
-        )
-
-        self.backstory: Field = Field(
-            value=StringValue("Предыстория"),
-            default_font_size=8,
-            alignment='center',
-            auto_fit_font_size=True,
-            height=5,
-            length=80,
-            center_x=400,
-            center_y=735,
-        )
-
-        self.player_name: Field = Field(
-            value=StringValue("Имя игрока"),
-            default_font_size=8,
-            alignment='center',
-            auto_fit_font_size=True,
-            height=5,
-            length=80,
-            center_x=510,
-            center_y=735,
-        )
-
-        self.race: Field = Field(
-            value=StringValue("Раса"),
-            default_font_size=8,
-            alignment='center',
-            auto_fit_font_size=True,
-            height=5,
-            length=80,
-            center_x=310,
-            center_y=708,
-        )
-
-        self.alignment: Field = Field(
-            value=StringValue("Мировоззрение"),
-            default_font_size=8,
-            alignment='center',
-            auto_fit_font_size=True,
-            height=5,
-            length=80,
-            center_x=400,
-            center_y=708,
-        )
-
-        self.experience: Field = Field(
-            value=IntegerValue("Опыт"),
-            default_font_size=8,
-            alignment='center',
-            auto_fit_font_size=True,
-            height=5,
-            length=80,
-            center_x=510,
-            center_y=708,
-        )
-
-        if abilities_modifiers_bigger:
-            self.strength: Field = Field(
-                value=StringValue("Сила"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=597,
-            )
-            self.strength_modifier: Field = Field(
-                value=StringValue("Модификатор силы"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=25,
-                center_x=55,
-                center_y=620,
-            )
-        else:
-            self.strength: Field = Field(
-                value=IntegerValue("Сила"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=620,
-            )
-            self.strength_modifier: Field = Field(
-                value=IntegerValueWithSign("Модификатор силы"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=25,
-                center_x=55,
-                center_y=597,
-            )
-
-        if abilities_modifiers_bigger:
-            self.dexterity: Field = Field(
-                value=IntegerValue("Ловкость"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=525,
-            )
-
-            self.dexterity_modifier: Field = Field(
-                value=IntegerValueWithSign("Модификатор ловкости"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=25,
-                center_x=55,
-                center_y=548,
-            )
-        else:
-            self.dexterity: Field = Field(
-                value=IntegerValue("Ловкость"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=548,
-            )
-
-            self.dexterity_modifier: Field = Field(
-                value=IntegerValueWithSign("Модификатор ловкости"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=25,
-                center_x=55,
-                center_y=525,
-            )
-
-        if abilities_modifiers_bigger:
-            self.constitution: Field = Field(
-                value=IntegerValue("Телосложение"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=454,
-            )
-
-            self.constitution_modifier: Field = Field(
-                value=IntegerValueWithSign("Модификатор телосложения"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=25,
-                center_x=55,
-                center_y=476,
-            )
-        else:
-            self.constitution: Field = Field(
-                value=IntegerValue("Телосложение"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=476,
-            )
-
-            self.constitution_modifier: Field = Field(
-                value=IntegerValueWithSign("Модификатор телосложения"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=25,
-                center_x=55,
-                center_y=454,
-            )
-
-        if abilities_modifiers_bigger:
-            self.intelligence: Field = Field(
-                value=IntegerValue("Интеллект"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=382,
-            )
-
-            self.intelligence_modifier: Field = Field(
-                value=IntegerValueWithSign("Модификатор интеллекта"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=25,
-                center_x=55,
-                center_y=404,
-            )
-        else:
-            self.intelligence: Field = Field(
-                value=IntegerValue("Интеллект"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=404,
-            )
-
-            self.intelligence_modifier: Field = Field(
-                value=IntegerValueWithSign("Модификатор интеллекта"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=25,
-                center_x=55,
-                center_y=382,
-            )
-        if abilities_modifiers_bigger:
-            self.wisdom: Field = Field(
-                value=IntegerValue("Мудрость"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=310,
-            )
-            self.wisdom_modifier: Field = Field(
-                value=IntegerValueWithSign("Модификатор мудрости"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=25,
-                center_x=55,
-                center_y=335,
-            )
-        else:
-            self.wisdom: Field = Field(
-                value=IntegerValue("Мудрость"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=335,
-            )
-            self.wisdom_modifier: Field = Field(
-                value=IntegerValueWithSign("Модификатор мудрости"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=25,
-                center_x=55,
-                center_y=310,
-            )
-
-        if abilities_modifiers_bigger:
-            self.charisma: Field = Field(
-                value=IntegerValue("Харизма"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=238,
-            )
-            self.charisma_modifier: Field = Field(
-                value=IntegerValueWithSign("Модификатор Харизмы"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=263,
-            )
-        else:
-            self.charisma: Field = Field(
-                value=IntegerValue("Харизма"),
-                default_font_size=24,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=263,
-            )
-            self.charisma_modifier: Field = Field(
-                value=IntegerValueWithSign("Модификатор Харизмы"),
-                default_font_size=10,
-                alignment='center',
-                auto_fit_font_size=True,
-                height=5,
-                length=15,
-                center_x=55,
-                center_y=238,
-            )
+        self.layout = field_layout(abilities_modifiers_bigger)
+        self.values = [None] * len(self.layout.fields)
+        self.font_sizes = [0] * len(self.layout.fields)  # zero, if use Field default
+        self.fragments = [None] * len(self.layout.fields)  # (key the fragment was made for, Fragment)
+        self.overlay = None  # (fragments the overlay was drawn from, overlay PDF bytes)
+
+    def get_field(self, field_name: str):
+        return self.values[self.layout.position(field_name)]
 
     def set_field(self, *, field_name: str, value, override_font_size: int = 0):
-        for prop_name in self.__dict__:
-            field = self.__dict__[prop_name]
-            if not isinstance(field, Field):
-                continue
-            if field.value.name.lower() == field_name.lower():  # first match
-                break
-        else:
-            raise ValueError(f'Field with name "{field_name}" not found')
-        field.value.value = value
+        position = self.layout.position(field_name)
+        self.values[position] = value
         if override_font_size:
-            field.value.font_size = override_font_size
+            self.font_sizes[position] = override_font_size
+
+    def set_fields(self, values: typing.Mapping[str, typing.Any],
+                   override_font_sizes: typing.Optional[typing.Mapping[str, int]] = None):
+        """
+        Sets many fields at once. Nothing is changed if any name is unknown, all unknown names are reported together
+        :param values: field name (Russian or English, any case) -> value
+        :param override_font_sizes: field name -> font size, for the fields that need a non default one
+        """
+        override_font_sizes = override_font_sizes or {}
+        fields_by_name = self.layout.fields_by_name
+        unknown_names = [name for name in list(values) + list(override_font_sizes)
+                         if name.lower() not in fields_by_name]
+        if unknown_names:
+            raise ValueError(f'Fields with names {unknown_names} not found')
+        for name, value in values.items():
+            self.values[fields_by_name[name.lower()]] = value
+        for name, font_size in override_font_sizes.items():
+            if font_size:
+                self.font_sizes[fields_by_name[name.lower()]] = font_size
+
+    def current_fragments(self) -> typing.Tuple[Fragment, ...]:
+        """
+        Fragments of all fields, recomputing only those whose value or font size changed since the last call.
+        The value type is a part of the key, so 1 and True or 1 and '1' never share a fragment.
+        Fields that were never set have no fragment (None) and are left blank.
+        Names of the recomputed fields are reported in the details of the "fragments" stage
+        """
+        with render_hooks.stage('fragments') as stage:
+            recomputed = []
+            for position, (field, value, font_size) in enumerate(zip(self.layout.fields, self.values,
+                                                                     self.font_sizes)):
+                key = (type(value), value, font_size)
+                cached = self.fragments[position]
+                if cached is not None and cached[0] == key:
+                    continue
+                recomputed.append(field.name)
+                self.fragments[position] = (key, None if value is None else field.fragment(value, font_size))
+            stage.details['fields'] = recomputed
+            return tuple(fragment for _, fragment in self.fragments)
+
+    def overlay_pdf(self) -> bytes:
+        fragments = self.current_fragments()
+        with render_hooks.stage('overlay') as stage:
+            stage.details['cached'] = self.overlay is not None and self.overlay[0] == fragments
+            if not stage.details['cached']:
+                pdf = canvas.Canvas(None)  # never saved to a file, the data is taken with getpdfdata
+                font_registry.register(DEFAULT_FONT)
+                for fragment in fragments:
+                    if fragment is not None:
+                        draw_fragment(pdf, fragment)
+                self.overlay = (fragments, pdf.getpdfdata())
+            stage.bytes = len(self.overlay[1])
+            return self.overlay[1]
+
+    def render_to(self, sink):
+        """
+        Writes the filled sheet straight into sink, nothing is written to disk
+        :param sink: anything with a write(bytes) method: an open file, BytesIO, socket.makefile('wb')...
+        """
+        with render_hooks.render(self.result_file_name or getattr(sink, 'name', '<stream>')):
+            overlay = self.overlay_pdf()
+            with render_hooks.stage('merge') as stage:
+                counting_sink = CountingSink(sink)
+                merge_to(overlay, template_path=self.template_file, sink=counting_sink)
+                stage.bytes = counting_sink.bytes
+
+    def render_bytes(self) -> bytes:
+        form = io.BytesIO()
+        self.render_to(form)
+        return form.getvalue()  # the buffer itself, BytesIO does not copy it when nothing else references it
 
     def render(self):
-        data = io.BytesIO()
-        pdf = canvas.Canvas(data)
-        pdfmetrics.registerFont(TTFont('FreeSans', 'FreeSans.ttf'))
-
-        for field in self.__dict__.values():
-            if not isinstance(field, Field):
-                continue
-            print(f'Rendering "{field}"')
-            field.render(pdf)
-
-        pdf.save()
-        data.seek(0)
-        form = merge(data, template_path=self.template_file)
-        with open(f'{self.result_file_name}', 'wb') as f:
-            f.write(form.read())
+        with replacing_file(self.result_file_name) as f:
+            self.render_to(f)
 
 
 if __name__ == '__main__':
@@ -508,97 +285,27 @@ if __name__ == '__main__':
         result_file_name='empty.pdf',
         abilities_modifiers_bigger=True,
     )
-    empty_sheet.set_field(
-        field_name="Имя персонажа",
-        value='Чебурашка',
-    )
-    empty_sheet.set_field(
-        field_name="Класс и уровень",
-        value='Колдун 1',
-    )
-
-    empty_sheet.set_field(
-        field_name="Предыстория",
-        value='Отшельник',
-    )
-
-    empty_sheet.set_field(
-        field_name="Имя игрока",
-        value='Губка Боб',
-    )
-
-    empty_sheet.set_field(
-        field_name="Раса",
-        value='Полурослик',
-    )
-
-    empty_sheet.set_field(
-        field_name="Мировоззрение",
-        value='Законно добрый',
-    )
-
-    empty_sheet.set_field(
-        field_name="Опыт",
-        value='',
-    )
-
-    empty_sheet.set_field(
-        field_name="Сила",
-        value='16',
-    )
-
-    empty_sheet.set_field(
-        field_name="Модификатор силы",
-        value='+3',
-    )
-
-    empty_sheet.set_field(
-        field_name="Ловкость",
-        value='20',
-    )
-
-    empty_sheet.set_field(
-        field_name="Модификатор ловкости",
-        value='-90',
-    )
-
-    empty_sheet.set_field(
-        field_name="Телосложение",
-        value='0',
-    )
-
-    empty_sheet.set_field(
-        field_name="Модификатор телосложения",
-        value='-3',
-    )
-
-    empty_sheet.set_field(
-        field_name="Интеллект",
-        value='100',
-    )
-
-    empty_sheet.set_field(
-        field_name="Модификатор интеллекта",
-        value='+3',
-    )
-
-    empty_sheet.set_field(
-        field_name="Мудрость",
-        value='-5',
-    )
-    empty_sheet.set_field(
-        field_name="Модификатор Мудрости",
-        value='2',
-    )
-
-    empty_sheet.set_field(
-        field_name="Харизма",
-        value='60',
-    )
-
-    empty_sheet.set_field(
-        field_name="Модификатор Харизмы",
-        value='12',
-    )
-
-    empty_sheet.render()
+    empty_sheet.set_fields({
+        'Имя персонажа': 'Чебурашка',
+        'Класс и уровень': 'Колдун 1',
+        'Предыстория': 'Отшельник',
+        'Имя игрока': 'Губка Боб',
+        'Раса': 'Полурослик',
+        'Мировоззрение': 'Законно добрый',
+        'Опыт': '',
+        'Сила': '16',
+        'Модификатор силы': '+3',
+        'Ловкость': '20',
+        'Модификатор ловкости': '-90',
+        'Телосложение': '0',
+        'Модификатор телосложения': '-3',
+        'Интеллект': '100',
+        'Модификатор интеллекта': '+3',
+        'Мудрость': '-5',
+        'Модификатор Мудрости': '2',
+        'Харизма': '60',
+        'Модификатор Харизмы': '12',
+    })
+
+    with render_hooks.listening(print_stage):
+        empty_sheet.render()
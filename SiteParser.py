@@ -1,44 +1,149 @@
-from collections import namedtuple
 import aiohttp
 import asyncio
+import functools
+import os
+import random
+import re
 import typing
-from bs4 import BeautifulSoup
+from collections import namedtuple
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.element import Tag
+from spell_cache import SpellCache, normalize_name, spell_cache
+from spell_index import SpellIndex
+from spells import Spell, SpellAttribute, attributes_translations_dict, spell_nice_print  # noqa: F401
+
+SPELLS_URL_ENVIRONMENT_VARIABLE = 'CHARACTER_SHEET_SPELLS_URL'  # e.g. a replay, see benchmarks.spell_site
+SPELLS_URL = os.environ.get(SPELLS_URL_ENVIRONMENT_VARIABLE) or 'http://dungeon.su/spells/'
+DEFAULT_MAX_IN_FLIGHT = 8  # simultaneous requests to the site, more only gets us throttled
+DEFAULT_REQUEST_TIMEOUT = 20  # seconds for one attempt to fetch and parse one spell
+DEFAULT_RETRIES = 3  # attempts after the first one, only for 5xx responses, connection errors and timeouts
+BACKOFF_BASE = 0.5  # seconds, the delay before the n-th retry is random up to BACKOFF_BASE * 2 ** (n - 1)
+BACKOFF_CAP = 10  # seconds, the longest delay between retries
+DEFAULT_KEEPALIVE_TIMEOUT = 60  # seconds an idle connection to the site stays open
+DEFAULT_DNS_CACHE_TTL = 300  # seconds
+DEFAULT_HEADERS = {'Accept': 'text/html,application/xhtml+xml,application/xml',
+                   'Accept-Encoding': 'gzip, deflate'}  # spell pages are mostly markup and compress several times
+ARTICLE_TYPE = 'https://schema.org/Article'  # itemtype of the container of every spell on a search result page
+ARTICLE_STRAINER = SoupStrainer(name='div', attrs={'itemtype': ARTICLE_TYPE})
+DIV_TAG_PATTERN = re.compile(r'<(/?)div\b[^>]*>', re.IGNORECASE)
+
+SpellFailure = namedtuple('SpellFailure', ('name', 'error', 'attempts'))
+FetchResult = namedtuple('FetchResult', ('spells', 'failures'))
+
+
+class InFlightCall:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
 
-Spell = namedtuple('Spell', ('name', 'level', 'school', 'cast_time', 'range', 'components', 'duration', 'classes',
-                             'source', 'higher_levels', 'description'))
-SpellAttribute = namedtuple('SpellAttribute', ('ru_name', 'ru_value', 'en_name', 'en_value'))
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the call and everyone asking for the same
+    key while it runs awaits that call instead of starting another one. The call is cancelled only when all of its
+    callers are cancelled
+    """
 
+    def __init__(self):
+        self._calls = {}  # type: typing.Dict[typing.Hashable, InFlightCall]
+        self.shared = 0  # calls answered by joining one already in flight
 
-def spell_nice_print(s: Spell) -> str:
-    output_string = f'{s.name.ru_value} ({s.name.en_value})'
-    for value in sorted(s._asdict().values()):
-        if value.ru_name == 'Имя':
-            continue
-        output_string += f'\n\t{value.ru_name.title():25}: {value.ru_value}'
+    async def run(self, key: typing.Hashable, function, *args, **kwargs):
+        call = self._calls.get(key)
+        if call is None:
+            call = InFlightCall(asyncio.ensure_future(function(*args, **kwargs)))
+            call.task.add_done_callback(functools.partial(self._forget, key, call))
+            self._calls[key] = call
+        else:
+            self.shared += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)  # a new caller has to start afresh, not join a dying call
+                call.task.cancel()
+            raise
 
-    output_string += '\n'
-    return output_string
+    def _forget(self, key: typing.Hashable, call: InFlightCall, *_):
+        if self._calls.get(key) is call:
+            del self._calls[key]
 
+    def __len__(self):
+        return len(self._calls)
 
-Spell.__repr__ = spell_nice_print
 
-attributes_translations_dict = {'уровень': 'level',
-                                'школа': 'school',
-                                'время накладывания': 'cast_time',
-                                'дистанция': 'range',
-                                'компоненты': 'components',
-                                'длительность': 'duration',
-                                'классы': 'classes',
-                                'источник': 'source',
-                                'на больших уровнях': 'higher_levels',
-                                'имя': 'name',
-                                'описание': 'description',
-                                }
+spell_lookups = SingleFlight()
 
 
-async def fetch_spell(*, eng_spell_name: str, session: aiohttp.client.ClientSession, debug: bool = False) \
+async def fetch_spell(*, eng_spell_name: str, session: aiohttp.client.ClientSession, debug: bool = False,
+                      cache: typing.Optional[SpellCache] = spell_cache,
+                      limiter: typing.Optional[asyncio.Semaphore] = None,
+                      timeout: typing.Optional[float] = None,
+                      index: typing.Optional[SpellIndex] = None) -> typing.Optional[Spell]:
+    """
+    Looks the spell up in index and cache first and downloads it only if it is not there or expired.
+    Concurrent lookups of the same spell (normalized name) with the same cache share one lookup, so a party
+    asking for Shield five times makes one request. The settings of the first caller are used for the shared lookup
+    :param eng_spell_name: English name to search for
+    :param session: session to download with
+    :param debug: print requested URLs
+    :param cache: where parsed spells are kept, None to always download. An offline cache never downloads
+    :param limiter: semaphore to hold while looking up, waiting for it does not count against timeout
+    :param timeout: seconds for the lookup once limiter is acquired, None for no limit
+    :param index: local spell index. Spells found by exact name are never downloaded, downloaded ones are added,
+    and a name the site does not know or finds several spells for is resolved in the index
+    :return: the spell, or None if it is not found or the search is ambiguous
+    """
+    if index is not None:
+        spell = index.get(eng_spell_name)
+        if spell is not None:
+            return spell
+
+    spell = await spell_lookups.run((normalize_name(eng_spell_name), cache), look_up_spell,
+                                    eng_spell_name=eng_spell_name, session=session, debug=debug, cache=cache,
+                                    limiter=limiter, timeout=timeout)
+    if index is not None:
+        if spell is not None:
+            index.add(spell)
+        else:
+            spell = index.resolve(eng_spell_name)
+            if spell is not None:
+                print(f'Spell "{eng_spell_name}" resolved to "{spell.name.en_value}" in the local index')
+    return spell
+
+
+async def look_up_spell(*, eng_spell_name: str, session: aiohttp.client.ClientSession, debug: bool,
+                        cache: typing.Optional[SpellCache], limiter: typing.Optional[asyncio.Semaphore],
+                        timeout: typing.Optional[float]) -> typing.Optional[Spell]:
+    if limiter is None:
+        return await asyncio.wait_for(cached_or_downloaded_spell(eng_spell_name, session, debug, cache), timeout)
+    async with limiter:
+        return await asyncio.wait_for(cached_or_downloaded_spell(eng_spell_name, session, debug, cache), timeout)
+
+
+async def cached_or_downloaded_spell(eng_spell_name: str, session: aiohttp.client.ClientSession, debug: bool,
+                                     cache: typing.Optional[SpellCache]) -> typing.Optional[Spell]:
+    if cache is not None:
+        spell = cache.get(eng_spell_name)
+        if spell is not None:
+            return spell
+        if cache.offline:
+            print(f'Spell "{eng_spell_name}" is not cached and the cache is offline')
+            return None
+
+    spell = await download_spell(eng_spell_name=eng_spell_name, session=session, debug=debug)
+    if spell is not None and cache is not None:
+        cache.put(eng_spell_name, spell)
+    return spell
+
+
+async def download_spell(*, eng_spell_name: str, session: aiohttp.client.ClientSession, debug: bool = False) \
         -> typing.Optional[Spell]:
-    searching_url = 'http://dungeon.su/spells/'
+    searching_url = SPELLS_URL
     # searching_url = f'http://dungeon.su/spells/{eng_spell_name}'
     async with session.get(searching_url, headers={'Accept': 'text/html,application/xhtml+xml,application/xml',
                                                    'Content-Type': 'text/html'},
@@ -47,97 +152,154 @@ async def fetch_spell(*, eng_spell_name: str, session: aiohttp.client.ClientSess
             print(f'Fetching spell "{eng_spell_name}"')
             print(response.url)
 
+        response.raise_for_status()
         response_binary = await response.read()
-        html = BeautifulSoup(response_binary.decode('utf-8'), 'html.parser')
-        articles = html.find_all(name='div', attrs={
-            'itemtype': "https://schema.org/Article"})  # type: typing.List[BeautifulSoup.element.Tag]
-        if len(articles) == 0:
-            print(f'No spells with name "{eng_spell_name}" found')
-            return
-        elif len(articles) > 1:
-            names = []
-            for article in articles:
-                name_tag = article.find('a', attrs={'class': 'item-link', 'itemprop': 'url'})
-                if '(' in name_tag.text:
-                    eng_name = name_tag.text.split('(')[1].strip().replace(')', '')
-                else:
-                    eng_name = name_tag.text
-                names.append(eng_name)
-            print(f'{len(articles)} spells with name "{eng_spell_name}" found: {names}\nPlease refine your search')
+    return parse_spell_page(response_binary.decode('utf-8'), eng_spell_name)
 
-            return None
 
-        spell_attributes_dict = {'level': SpellAttribute(ru_name='уровень', ru_value=-1,
-                                                         en_name='level', en_value=-1),
-                                 'school': SpellAttribute(ru_name='школа', ru_value='нет',
-                                                          en_name='school', en_value='na'),
-                                 'cast_time': SpellAttribute(ru_name='время накладывания', ru_value='нет',
-                                                             en_name='cast_time', en_value='na'),
-                                 'duration': SpellAttribute(ru_name='длительность', ru_value='na',
-                                                            en_name='duration', en_value='na'),
-                                 'range': SpellAttribute(ru_name='дистанция', ru_value='na',
-                                                         en_name='range', en_value='na'),
-                                 'components': SpellAttribute(ru_name='компоненты', ru_value=[],
-                                                              en_name='components', en_value=[]),
-                                 'classes': SpellAttribute(ru_name='классы', ru_value=[],
-                                                           en_name='classes', en_value=[]),
-                                 'source': SpellAttribute(ru_name='источник', ru_value='na',
-                                                          en_name='source', en_value='na'),
-                                 'higher_levels': SpellAttribute(ru_name='на больших уровнях', ru_value='',
-                                                                 en_name='higher levels', en_value='na'),
-                                 'name': SpellAttribute(ru_name='имя', ru_value=eng_spell_name,
-                                                        en_name='name', en_value=''),
-                                 'description': SpellAttribute(ru_name='описание', ru_value='Нет описания',
-                                                               en_name='description', en_value='No description')}
-
-        article = articles[0]  # type: BeautifulSoup.element.Tag
-        name_tag = article.find('a', attrs={'class': 'item-link', 'itemprop': 'url'})
-        if not name_tag:
-            print(f'Name tag not found for {eng_spell_name}')
-            return
-        spell_attributes_dict['name'] = SpellAttribute(ru_name='имя',
-                                                       ru_value=name_tag.text.split('(')[0].strip(),
-                                                       en_name='name',
-                                                       en_value=name_tag.text.split('(')[1].strip().replace(')', ''))
+def find_articles(html_text: str) -> typing.List[Tag]:
+    """
+    Parses only the schema.org/Article containers of the page: everything before the first one and after
+    the last one (head, scripts, menus, sidebar, footer) is skipped without tokenizing, and only article
+    elements are built into a tree
+    """
+    first = html_text.find(ARTICLE_TYPE)
+    if first < 0:
+        return []
+    start = html_text.rfind('<', 0, first)  # the tag that carries the first itemtype
+    last = html_text.rfind('<', 0, html_text.rfind(ARTICLE_TYPE))
+    html = BeautifulSoup(html_text[start:element_end(html_text, last)], 'html.parser', parse_only=ARTICLE_STRAINER)
+    return html.find_all(name='div', attrs={'itemtype': ARTICLE_TYPE})
 
-        article_body = article.find(name='div', attrs={"class": "card-body", "itemprop": "articleBody"})
-        # type: BeautifulSoup.element.Tag
 
-        if not article_body:
-            print(f'Cannot find any spell on html page')
-            return None
+def element_end(html_text: str, start: int) -> int:
+    """
+    Position right after the </div> closing the div that starts at start, the end of the text if it is not closed
+    """
+    depth = 0
+    for match in DIV_TAG_PATTERN.finditer(html_text, start):
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return match.end()
+    return len(html_text)
+
+
+def parse_spell_page(html_text: str, eng_spell_name: str) -> typing.Optional[Spell]:
+    """
+    Extracts the spell from a search result page
+    :param html_text: the page
+    :param eng_spell_name: the name that was searched for
+    :return: the spell, or None if the page has no spells or several of them
+    """
+    return spell_from_articles(find_articles(html_text), eng_spell_name)
+
+
+def spells_from_page(html_text: str) -> typing.List[Spell]:
+    """
+    Every spell of a search result page, also when there are several of them
+    """
+    spells = []
+    for article in find_articles(html_text):
+        spell = spell_from_articles([article], article_english_name(article))
+        if spell is not None:
+            spells.append(spell)
+    return spells
+
+
+def article_english_name(article: Tag) -> str:
+    name_tag = article.find('a', attrs={'class': 'item-link', 'itemprop': 'url'})
+    if name_tag is None:
+        return ''
+    if '(' in name_tag.text:
+        return name_tag.text.split('(')[1].strip().replace(')', '')
+    return name_tag.text
+
+
+def spell_from_articles(articles: typing.List[Tag], eng_spell_name: str) -> typing.Optional[Spell]:
+    if len(articles) == 0:
+        print(f'No spells with name "{eng_spell_name}" found')
+        return
+    elif len(articles) > 1:
+        exact = [article for article in articles if normalize_name(article_english_name(article)) ==
+                 normalize_name(eng_spell_name)]
+        if len(exact) == 1:  # "Shield" also finds "Shield of Faith"
+            return spell_from_articles(exact, eng_spell_name)
+        names = [article_english_name(article) for article in articles]
+        print(f'{len(articles)} spells with name "{eng_spell_name}" found: {names}\nPlease refine your search')
 
-        for attribute_tag in article_body('ul')[0]('li'):  # iterate over each <li> tag
-
-            if attribute_tag.find(name='div', attrs={'itemprop': 'description'}):
-                description_tag = attribute_tag.find(name='div', attrs={'itemprop': 'description'})
-                if "На больших уровнях:" in description_tag.text:
-                    ru_desc = description_tag.text.split('На больших уровнях:')[0].strip()
-                    ru_higher_levels = description_tag.text.split('На больших уровнях:')[1].strip()
-                    spell_attributes_dict['description'] = SpellAttribute(ru_name='описание',
-                                                                          ru_value=ru_desc,
-                                                                          en_name='description',
-                                                                          en_value='')
-                    spell_attributes_dict['higher_levels'] = SpellAttribute(ru_name='на больших уровнях',
-                                                                            ru_value=ru_higher_levels,
-                                                                            en_name='higher levels',
-                                                                            en_value='')
-                else:
-                    spell_attributes_dict['description'] = SpellAttribute(ru_name='описание',
-                                                                          ru_value=description_tag.text,
-                                                                          en_name='description',
-                                                                          en_value='')
+        return None
+
+    spell_attributes_dict = {'level': SpellAttribute(ru_name='уровень', ru_value=-1,
+                                                     en_name='level', en_value=-1),
+                             'school': SpellAttribute(ru_name='школа', ru_value='нет',
+                                                      en_name='school', en_value='na'),
+                             'cast_time': SpellAttribute(ru_name='время накладывания', ru_value='нет',
+                                                         en_name='cast_time', en_value='na'),
+                             'duration': SpellAttribute(ru_name='длительность', ru_value='na',
+                                                        en_name='duration', en_value='na'),
+                             'range': SpellAttribute(ru_name='дистанция', ru_value='na',
+                                                     en_name='range', en_value='na'),
+                             'components': SpellAttribute(ru_name='компоненты', ru_value=[],
+                                                          en_name='components', en_value=[]),
+                             'classes': SpellAttribute(ru_name='классы', ru_value=[],
+                                                       en_name='classes', en_value=[]),
+                             'source': SpellAttribute(ru_name='источник', ru_value='na',
+                                                      en_name='source', en_value='na'),
+                             'higher_levels': SpellAttribute(ru_name='на больших уровнях', ru_value='',
+                                                             en_name='higher levels', en_value='na'),
+                             'name': SpellAttribute(ru_name='имя', ru_value=eng_spell_name,
+                                                    en_name='name', en_value=''),
+                             'description': SpellAttribute(ru_name='описание', ru_value='Нет описания',
+                                                           en_name='description', en_value='No description')}
+
+    article = articles[0]  # type: BeautifulSoup.element.Tag
+    name_tag = article.find('a', attrs={'class': 'item-link', 'itemprop': 'url'})
+    if not name_tag:
+        print(f'Name tag not found for {eng_spell_name}')
+        return
+    spell_attributes_dict['name'] = SpellAttribute(ru_name='имя',
+                                                   ru_value=name_tag.text.split('(')[0].strip(),
+                                                   en_name='name',
+                                                   en_value=name_tag.text.split('(')[1].strip().replace(')', ''))
+
+    article_body = article.find(name='div', attrs={"class": "card-body", "itemprop": "articleBody"})
+    # type: BeautifulSoup.element.Tag
+
+    if not article_body:
+        print(f'Cannot find any spell on html page')
+        return None
+
+    for attribute_tag in article_body('ul')[0]('li'):  # iterate over each <li> tag
+
+        if attribute_tag.find(name='div', attrs={'itemprop': 'description'}):
+            description_tag = attribute_tag.find(name='div', attrs={'itemprop': 'description'})
+            if "На больших уровнях:" in description_tag.text:
+                ru_desc = description_tag.text.split('На больших уровнях:')[0].strip()
+                ru_higher_levels = description_tag.text.split('На больших уровнях:')[1].strip()
+                spell_attributes_dict['description'] = SpellAttribute(ru_name='описание',
+                                                                      ru_value=ru_desc,
+                                                                      en_name='description',
+                                                                      en_value='')
+                spell_attributes_dict['higher_levels'] = SpellAttribute(ru_name='на больших уровнях',
+                                                                        ru_value=ru_higher_levels,
+                                                                        en_name='higher levels',
+                                                                        en_value='')
             else:
-                ru_name = attribute_tag('strong')[0].text.replace(':', '')
-                if ru_name.lower() not in attributes_translations_dict:
-                    continue
+                spell_attributes_dict['description'] = SpellAttribute(ru_name='описание',
+                                                                      ru_value=description_tag.text,
+                                                                      en_name='description',
+                                                                      en_value='')
+        else:
+            ru_name = attribute_tag('strong')[0].text.replace(':', '')
+            if ru_name.lower() not in attributes_translations_dict:
+                continue
 
-                ru_value = attribute_tag.text.replace(f'{ru_name}:', '').strip().replace('«', '').replace('»', '')
-                en_name = attributes_translations_dict[ru_name.lower()]
-                spell_attributes_dict[attributes_translations_dict[ru_name.lower()]] = SpellAttribute(ru_name=ru_name,
-                                                                                                      ru_value=ru_value,
-                                                                                                      en_name=en_name,
-                                                                                                      en_value='')
+            ru_value = attribute_tag.text.replace(f'{ru_name}:', '').strip().replace('«', '').replace('»', '')
+            en_name = attributes_translations_dict[ru_name.lower()]
+            spell_attributes_dict[attributes_translations_dict[ru_name.lower()]] = SpellAttribute(ru_name=ru_name,
+                                                                                                  ru_value=ru_value,
+                                                                                                  en_name=en_name,
+                                                                                                  en_value='')
 
     return Spell(name=spell_attributes_dict['name'],
                  level=spell_attributes_dict['level'],
@@ -153,11 +315,169 @@ async def fetch_spell(*, eng_spell_name: str, session: aiohttp.client.ClientSess
                  )
 
 
-async def open_connection_and_fetch_spells(spell_names_list: typing.List[str]):
-    async with aiohttp.ClientSession() as session:
-        responses = await asyncio.gather(*[asyncio.create_task(
-                fetch_spell(eng_spell_name=spell_name, session=session)) for spell_name in spell_names_list])
-        return [r for r in responses if r]
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+
+def backoff_delay(attempt: int) -> float:
+    # "full jitter": retries of a throttled batch spread out instead of hitting the site again all at once
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def describe_error(error: BaseException) -> str:
+    return f'{type(error).__name__}: {error}' if str(error) else type(error).__name__
+
+
+async def fetch_spells(spell_names_list: typing.List[str],
+                       *,
+                       session: aiohttp.client.ClientSession,
+                       cache: typing.Optional[SpellCache] = spell_cache,
+                       max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                       request_timeout: typing.Optional[float] = DEFAULT_REQUEST_TIMEOUT,
+                       total_timeout: typing.Optional[float] = None,
+                       retries: int = DEFAULT_RETRIES,
+                       index: typing.Optional[SpellIndex] = None,
+                       debug: bool = False) -> FetchResult:
+    """
+    Fetches many spells with at most max_in_flight requests at a time. One failing or hanging spell never stops
+    the others: whatever was fetched is returned together with a failure for every other name
+    :param spell_names_list: English names
+    :param session: session to download with
+    :param cache: see fetch_spell
+    :param max_in_flight: most requests to run at the same time
+    :param request_timeout: seconds for one attempt, None for no limit
+    :param total_timeout: seconds for the whole batch, None for no limit. Unfinished spells become failures
+    :param retries: how many times to retry 5xx responses, connection errors and timeouts, with jittered backoff
+    :param index: see fetch_spell
+    :param debug: print requested URLs
+    :return: spells in the order of names, and SpellFailure(name, error, attempts) for the rest
+    """
+    semaphore = asyncio.Semaphore(max_in_flight)
+    attempts = [0] * len(spell_names_list)
+
+    async def fetch_one(position: int, name: str) -> typing.Optional[Spell]:
+        while True:
+            attempts[position] += 1
+            try:
+                return await fetch_spell(eng_spell_name=name, session=session, debug=debug, cache=cache,
+                                         limiter=semaphore, timeout=request_timeout, index=index)
+            except Exception as e:
+                if not is_retryable(e) or attempts[position] > retries:
+                    raise
+            await asyncio.sleep(backoff_delay(attempts[position]))  # outside the semaphore, so others can go meanwhile
+
+    tasks = [asyncio.create_task(fetch_one(position, name)) for position, name in enumerate(spell_names_list)]
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=total_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    spells = []
+    failures = []
+    for name, task, attempts_made in zip(spell_names_list, tasks, attempts):
+        if task.cancelled():
+            failures.append(SpellFailure(name=name, error='Batch deadline exceeded', attempts=attempts_made))
+        elif task.exception() is not None:
+            failures.append(SpellFailure(name=name, error=describe_error(task.exception()), attempts=attempts_made))
+        elif task.result() is None:
+            failures.append(SpellFailure(name=name, error='Not found', attempts=attempts_made))
+        else:
+            spells.append(task.result())
+    return FetchResult(spells=spells, failures=failures)
+
+
+class SpellClient:
+    """
+    Long-lived client for the spell site: one session and connection pool reused by every batch, so a running
+    process pays for connecting and resolving the host once and keeps the connections alive between batches.
+
+        async with SpellClient() as client:
+            result = await client.fetch(['fireball', 'shield'])
+    """
+
+    def __init__(self,
+                 *,
+                 cache: typing.Optional[SpellCache] = spell_cache,
+                 index: typing.Optional[SpellIndex] = None,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 request_timeout: typing.Optional[float] = DEFAULT_REQUEST_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES,
+                 keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+                 dns_cache_ttl: int = DEFAULT_DNS_CACHE_TTL):
+        """
+        :param cache: see fetch_spell
+        :param index: see fetch_spell, e.g. SpellIndex.load()
+        :param max_in_flight: most requests at the same time, also the connection limit for the site
+        :param request_timeout: default seconds for one attempt, see fetch_spells
+        :param retries: default number of retries, see fetch_spells
+        :param keepalive_timeout: seconds to keep an idle connection open
+        :param dns_cache_ttl: seconds to cache resolved addresses
+        """
+        self.cache = cache
+        self.index = index
+        self.max_in_flight = max_in_flight
+        self.request_timeout = request_timeout
+        self.retries = retries
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.session = None  # type: typing.Optional[aiohttp.ClientSession]
+
+    async def __aenter__(self) -> 'SpellClient':
+        self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def open(self):
+        """
+        Creates the session, has to be called from a running event loop
+        """
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(limit_per_host=self.max_in_flight,
+                                         keepalive_timeout=self.keepalive_timeout,
+                                         use_dns_cache=True,
+                                         ttl_dns_cache=self.dns_cache_ttl)
+        self.session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def fetch(self, spell_names_list: typing.List[str], **options) -> FetchResult:
+        """
+        Fetches a batch, see fetch_spells for the options. The client settings are used for the ones not given
+        """
+        if self.session is None:
+            raise ValueError('SpellClient is not open, use it in "async with" or call open() first')
+        options.setdefault('max_in_flight', self.max_in_flight)
+        options.setdefault('request_timeout', self.request_timeout)
+        options.setdefault('retries', self.retries)
+        options.setdefault('index', self.index)
+        return await fetch_spells(spell_names_list, session=self.session, cache=self.cache, **options)
+
+    async def fetch_spell(self, eng_spell_name: str, **options) -> typing.Optional[Spell]:
+        result = await self.fetch([eng_spell_name], **options)
+        return result.spells[0] if result.spells else None
+
+
+async def open_connection_and_fetch_spells(spell_names_list: typing.List[str],
+                                           cache: typing.Optional[SpellCache] = spell_cache,
+                                           **options) -> typing.List[Spell]:
+    """
+    Fetches spells with a short-lived SpellClient, see fetch_spells for the options. Failures are printed.
+    Processes fetching many batches should keep one SpellClient instead
+    """
+    async with SpellClient(cache=cache) as client:
+        result = await client.fetch(spell_names_list, **options)
+    for failure in result.failures:
+        print(f'Cannot fetch spell "{failure.name}" ({failure.attempts} attempts): {failure.error}')
+    return result.spells
 
 
 if __name__ == '__main__':
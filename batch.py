@@ -0,0 +1,190 @@
+import argparse
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import glob
+import os
+import sys
+import typing
+from collections import namedtuple
+
+import parser
+import templates
+from fonts import DEFAULT_FONT, font_registry
+from sheet_layout import layout_registry
+
+BatchResult = namedtuple('BatchResult', ('xml_path', 'pdf_path', 'error'))
+WORKER_DIED_ERROR = 'BrokenProcessPool: the worker process died while rendering it'
+
+# Set once per worker process by init_worker, the template itself is parsed once and then served from the cache
+worker_template_filename = 'character_sheet_light.pdf'
+
+
+def init_worker(template_filename: str):
+    global worker_template_filename
+    font_registry.register(DEFAULT_FONT)
+    templates.template_cache.get(template_filename)
+    layout_registry.for_template(template_filename)
+    worker_template_filename = template_filename
+
+
+def collect_xml_files(paths: typing.Iterable[str]) -> typing.List[str]:
+    """
+    Expands directories and glob patterns into a sorted list of XML files, without duplicates
+    :param paths: directories (all *.xml inside are taken), glob patterns or plain file names
+    :return:
+    """
+    found = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found.update(glob.glob(os.path.join(path, '*.xml')))
+        else:
+            found.update(glob.glob(path))
+    return sorted(found)
+
+
+def pdf_path_for(xml_path: str, output_dir: typing.Optional[str]) -> str:
+    pdf_name = os.path.splitext(os.path.basename(xml_path))[0] + '.pdf'
+    return os.path.join(output_dir or os.path.dirname(xml_path), pdf_name)
+
+
+def pdf_targets(xml_files: typing.List[str], output_dir: typing.Optional[str]) -> typing.List[typing.Tuple[str, str]]:
+    """
+    PDF path for every XML, each one different: a/Bob.xml and b/Bob.xml rendered into one output_dir
+    become Bob.pdf and Bob_2.pdf instead of overwriting each other
+    :return: (xml_path, pdf_path) pairs in the order of xml_files
+    """
+    targets = []
+    used_paths = set()
+    for xml_path in xml_files:
+        pdf_path = pdf_path_for(xml_path, output_dir)
+        base, extension = os.path.splitext(pdf_path)
+        suffix = 1
+        while os.path.normcase(os.path.abspath(pdf_path)) in used_paths:
+            suffix += 1
+            pdf_path = f'{base}_{suffix}{extension}'
+        used_paths.add(os.path.normcase(os.path.abspath(pdf_path)))
+        targets.append((xml_path, pdf_path))
+    return targets
+
+
+def render_one(xml_path: str, pdf_path: str, skip_name: bool = False) -> BatchResult:
+    try:
+        parser.render_character_file(xml_path, pdf_path, template=worker_template_filename,
+                                     skip_name=skip_name)
+    except Exception as e:
+        return BatchResult(xml_path=xml_path, pdf_path=pdf_path, error=f'{type(e).__name__}: {e}')
+    return BatchResult(xml_path=xml_path, pdf_path=pdf_path, error=None)
+
+
+def render_batch(paths: typing.Iterable[str],
+                 *,
+                 output_dir: typing.Optional[str] = None,
+                 template_filename: str = 'character_sheet_light.pdf',
+                 jobs: typing.Optional[int] = None,
+                 skip_name: bool = False) -> typing.List[BatchResult]:
+    """
+    Renders every XML found in paths across a process pool. A failing character never stops the batch,
+    its error is reported in the returned list instead
+    :param paths: directories, glob patterns or file names
+    :param output_dir: where to put PDFs, next to each XML if not set. XMLs with the same name from different
+        directories get numbered PDFs, see pdf_targets
+    :param template_filename: template PDF, parsed once by every worker
+    :param jobs: number of worker processes, os.cpu_count() if not set. 1 renders in the current process.
+        ValueError if less than 1
+    :param skip_name: leave the character name field empty
+    :return: one BatchResult per XML file, in input order
+    """
+    xml_files = collect_xml_files(paths)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    targets = pdf_targets(xml_files, output_dir)
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs < 1:
+        raise ValueError(f'jobs must be at least 1, got {jobs}')
+
+    if jobs == 1:
+        init_worker(template_filename)
+        return [render_one(xml_path, pdf_path, skip_name) for xml_path, pdf_path in targets]
+
+    results, crashed = render_in_pool(targets, template_filename, jobs, skip_name)
+    # a dead worker takes every render it was running with it: the files rendered at the moment are tried again
+    # one at a time, so only the one that kills the worker again is reported
+    retried, crashed = render_in_pool(crashed, template_filename, 1, skip_name)
+    results.update(retried)
+    for xml_path, pdf_path in crashed:
+        results[xml_path] = BatchResult(xml_path=xml_path, pdf_path=pdf_path, error=WORKER_DIED_ERROR)
+    return [results[xml_path] for xml_path, _ in targets]
+
+
+def render_in_pool(targets: typing.List[typing.Tuple[str, str]], template_filename: str, jobs: int,
+                   skip_name: bool) -> typing.Tuple[typing.Dict[str, BatchResult], typing.List[typing.Tuple[str, str]]]:
+    """
+    Renders targets with jobs worker processes, at most jobs files at a time. When a worker dies (killed by
+    the OOM killer, a crash in reportlab) the pool is replaced and the rest of the files are rendered by the new one
+    :return: results by XML path, and the targets that were being rendered when a worker died
+    """
+    results = {}
+    crashed = []
+    queue = list(reversed(targets))
+    while queue:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                                    initargs=(template_filename,)) as executor:
+            in_flight = {}
+            broken = False
+            while (queue or in_flight) and not broken:
+                while queue and len(in_flight) < jobs:
+                    xml_path, pdf_path = queue[-1]
+                    try:
+                        future = executor.submit(render_one, xml_path, pdf_path, skip_name)
+                    except BrokenProcessPool:  # died after the last wait
+                        broken = True
+                        break
+                    in_flight[future] = queue.pop()
+                if broken:
+                    break
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    xml_path, pdf_path = in_flight.pop(future)
+                    try:
+                        results[xml_path] = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        crashed.append((xml_path, pdf_path))
+            crashed.extend(in_flight.values())  # failed with the pool, never finished
+            if broken and queue:
+                print(f'A worker process died, restarting the pool for {len(queue)} remaining characters')
+    return results, crashed
+
+
+def print_summary(results: typing.List[BatchResult]):
+    failures = [r for r in results if r.error]
+    print(f'Rendered {len(results) - len(failures)} of {len(results)} characters, {len(failures)} failed')
+    for failure in failures:
+        print(f'\t{failure.xml_path}: {failure.error}')
+
+
+def main(argv=None) -> int:
+    argument_parser = argparse.ArgumentParser(description='Render Fantasy Grounds exports into character sheets')
+    argument_parser.add_argument('paths', nargs='+', help='directories, glob patterns or XML files')
+    argument_parser.add_argument('-o', '--output-dir', help='where to put PDFs, next to each XML by default')
+    argument_parser.add_argument('-t', '--template', default='character_sheet_light.pdf', help='template PDF')
+    argument_parser.add_argument('-j', '--jobs', type=int, default=None,
+                                 help='number of worker processes, CPU count by default')
+    argument_parser.add_argument('--skip-name', action='store_true', help='leave the character name empty')
+    arguments = argument_parser.parse_args(argv)
+
+    if arguments.jobs is not None and arguments.jobs < 1:
+        argument_parser.error('--jobs must be at least 1')
+    results = render_batch(arguments.paths,
+                           output_dir=arguments.output_dir,
+                           template_filename=arguments.template,
+                           jobs=arguments.jobs,
+                           skip_name=arguments.skip_name)
+    print_summary(results)
+    return 1 if any(r.error for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Compares the table driven fantasy_grounds codec with the original per-character implementation.
+Checks that both produce identical output for every text node of the bundled XMLs, then times them
+on the long feature descriptions. Run from the repository root: python -m benchmarks.codec_benchmark
+"""
+import re
+import timeit
+import xml.etree.ElementTree as ElementTree
+
+from fantasy_grounds_codec import translate_from_iso_codes, translate_to_iso_codes
+
+BUNDLED_XMLS = ('Erdogan.xml', 'Leila.xml', 'Satar.xml', 'dragonborn.xml')
+
+
+def legacy_translate_to_iso_codes(text: str) -> str:
+    first_letter_code = 192
+    all_letters = 'АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯабвгдежзийклмнопрстуфхцчшщъыьэюя'
+    result_text = ''
+
+    for char in text:
+        if char == 'ё':
+            result_text += '&#184;'
+        elif char == 'Ё':
+            result_text += '&#168;'
+        elif char in all_letters:
+            char_position = all_letters.index(char)
+            code = first_letter_code + char_position
+            result_text += '&#%s;' % code
+        else:
+            result_text += char
+
+    return result_text
+
+
+def legacy_translate_from_iso_codes(text: str) -> str:
+    if isinstance(text, int):
+        return str(text)
+
+    if not text:
+        return ''
+
+    russian_letters = 'АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯабвгдежзийклмнопрстуфхцчшщъыьэюя'
+    for letter in text:
+        try:
+            letter_code = int.from_bytes(letter.encode('latin-1'), 'big')  # this is decoding from FG format
+        except UnicodeEncodeError:
+            continue
+
+        if 192 <= letter_code <= 256:
+            text = text.replace(letter, russian_letters[letter_code - 192])
+        elif letter_code == 184 or letter == '?':
+            text = text.replace(letter, 'ё')
+        elif letter_code == 168:
+            text = text.replace(letter, 'Ё')
+    output_text = text
+    letters = re.findall('&#.+?;', text)
+    for letter in letters:
+        if letter == '&#8226;':
+            ru_letter = '•'
+        elif letter == '&#8212;':
+            ru_letter = '—'
+        elif letter == '&#8722;':
+            ru_letter = '−'
+        elif letter == '&#8217;':
+            ru_letter = '’'
+        elif letter == '&#8211;':
+            ru_letter = '–'
+        elif letter == '&#184;':
+            ru_letter = 'ё'
+        else:
+            letter_number = int(letter[2:-1]) - 192
+            ru_letter = russian_letters[letter_number]
+
+        output_text = output_text.replace(letter, ru_letter)
+
+    return output_text
+
+
+def collect_texts():
+    texts, descriptions = [], []
+    for file_name in BUNDLED_XMLS:
+        for element in ElementTree.parse(file_name).getroot().iter():
+            if element.text:
+                texts.append(element.text)
+            if element.tag == 'text':
+                descriptions.append(' '.join(t.text for t in element if t.text))
+    return texts, descriptions
+
+
+def check_identical(texts):
+    for text in texts:
+        decoded = translate_from_iso_codes(text)
+        assert decoded == legacy_translate_from_iso_codes(text), text
+        assert translate_to_iso_codes(decoded) == legacy_translate_to_iso_codes(decoded), decoded
+        assert decoded.encode('fantasy_grounds').decode('fantasy_grounds') == translate_from_iso_codes(
+            translate_to_iso_codes(decoded)), decoded
+
+
+def bench(function, texts, repeat=5, number=3) -> float:
+    best = min(timeit.repeat(lambda: [function(t) for t in texts], repeat=repeat, number=number))
+    return best / number
+
+
+def main():
+    texts, descriptions = collect_texts()
+    check_identical(texts + descriptions)
+    print(f'Identical output for {len(texts) + len(descriptions)} texts')
+
+    long_descriptions = sorted(descriptions, key=len, reverse=True)[:50]
+    decoded = [translate_from_iso_codes(t) for t in long_descriptions]
+    print(f'{len(long_descriptions)} longest descriptions, {sum(map(len, long_descriptions))} characters in total')
+    for name, legacy, table_driven, data in (
+            ('from_iso_codes', legacy_translate_from_iso_codes, translate_from_iso_codes, long_descriptions),
+            ('to_iso_codes', legacy_translate_to_iso_codes, translate_to_iso_codes, decoded)):
+        legacy_time = bench(legacy, data)
+        new_time = bench(table_driven, data)
+        print(f'{name:15}: legacy {legacy_time * 1000:8.2f} ms, table {new_time * 1000:8.2f} ms, '
+              f'x{legacy_time / new_time:.1f}')
+
+
+if __name__ == '__main__':
+    main()
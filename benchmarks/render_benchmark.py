@@ -0,0 +1,215 @@
+"""
+End-to-end render benchmark over the bundled character XMLs and synthetically scaled copies of them with hundreds
+of features and inventory items. Every render is split into stages, timed separately:
+    load           Character(path): parsing the XML
+    transliterate  decoding and transliterating the sections the sheet prints, and evaluating the bindings
+    overlay        get_overlay_canvas
+    merge          merge with the template
+    write          writing the PDF file
+Reports the fastest time of every stage over the repeated renders (the least disturbed by anything else running
+on the machine), renders per second and the peak memory of one render. Results can be saved as JSON and compared
+with a saved baseline. Run from the repository root:
+python -m benchmarks.render_benchmark --output baseline.json
+python -m benchmarks.render_benchmark --baseline baseline.json --threshold 0.3
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+import xml.etree.ElementTree as ElementTree
+
+import parser
+from bindings import evaluate_bindings
+from sheet_layout import layout_registry
+from templates import merge
+
+BUNDLED_XMLS = ('Erdogan.xml', 'Leila.xml', 'Satar.xml', 'dragonborn.xml')
+SCALED_SOURCE = 'Erdogan.xml'
+DEFAULT_SCALES = ('200x300', '500x1000')  # features x inventory items
+STAGES = ('load', 'transliterate', 'overlay', 'merge', 'write')
+DEFAULT_REPEAT = 15
+DEFAULT_THRESHOLD = 0.20  # 20% slower or bigger is a regression
+MIN_SIGNIFICANT_SECONDS = 0.002  # smaller differences are noise, whatever the ratio
+
+
+def scaled_xml(source: str, features: int, items: int, directory: str) -> str:
+    """
+    Writes a copy of source whose feature list and inventory are filled up to the given sizes with numbered
+    copies of the existing entries
+    :return: path of the copy
+    """
+    tree = ElementTree.parse(source)
+    character = tree.getroot().find('character')
+    for section_name, size in (('featurelist', features), ('inventorylist', items)):
+        section = character.find(section_name)
+        originals = list(section)
+        for number in range(len(originals) + 1, size + 1):
+            entry = copy.deepcopy(originals[number % len(originals)])
+            entry.tag = f'id-{number:05d}'
+            name = entry.find('name')
+            if name is not None:
+                name.text = f'{name.text} {number}'  # list entries are keyed by name
+            section.append(entry)
+    path = os.path.join(directory, f'{os.path.splitext(os.path.basename(source))[0]}_{features}x{items}.xml')
+    tree.write(path, encoding='iso-8859-1', xml_declaration=True)
+    return path
+
+
+def render_stages(xml_path: str, pdf_path: str, template: str) -> typing.Dict[str, float]:
+    """
+    Renders xml_path into pdf_path the way parser.render_character_file does
+    :return: seconds of every stage
+    """
+    layout = layout_registry.for_template(template)
+    timings = {}
+    started = time.perf_counter()
+    character = parser.Character(xml_path)
+    timings['load'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    list(evaluate_bindings(character.xml))  # sections are decoded on first access and kept
+    timings['transliterate'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    overlay = parser.get_overlay_canvas(character, layout=layout)
+    timings['overlay'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    form = merge(overlay, template)
+    timings['merge'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with open(pdf_path, 'wb') as f:
+        f.write(form.getvalue())
+    timings['write'] = time.perf_counter() - started
+    return timings
+
+
+def peak_memory(xml_path: str, pdf_path: str, template: str) -> int:
+    """
+    Bytes allocated by Python at the peak of one render
+    """
+    tracemalloc.start()
+    try:
+        render_stages(xml_path, pdf_path, template)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_case(xml_path: str, pdf_path: str, template: str, repeat: int) -> dict:
+    render_stages(xml_path, pdf_path, template)  # the template, fonts and layouts are cached after this one
+    # the fastest of the runs for every stage and the whole render, not necessarily the same run
+    runs = [render_stages(xml_path, pdf_path, template) for _ in range(repeat)]
+    total = min(sum(run.values()) for run in runs)
+    return {'xml_bytes': os.path.getsize(xml_path),
+            'pdf_bytes': os.path.getsize(pdf_path),
+            'stages': {stage: min(run[stage] for run in runs) for stage in STAGES},
+            'total': total,
+            'renders_per_second': 1 / total,
+            'peak_memory': peak_memory(xml_path, pdf_path, template)}
+
+
+def run(cases: typing.Dict[str, str], template: str, repeat: int) -> dict:
+    results = {'python': platform.python_version(),
+               'platform': platform.platform(),
+               'repeat': repeat,
+               'cases': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, xml_path in cases.items():
+            pdf_path = os.path.join(directory, f'{name}.pdf')
+            results['cases'][name] = benchmark_case(xml_path, pdf_path, template, repeat)
+    return results
+
+
+def metrics(case: dict) -> typing.Dict[str, float]:
+    """
+    Everything compared with the baseline, all of them the lower the better
+    """
+    values = {f'{stage} s': seconds for stage, seconds in case['stages'].items()}
+    values['total s'] = case['total']
+    values['peak memory'] = case['peak_memory']
+    return values
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> typing.List[str]:
+    found = []
+    for name, case in results['cases'].items():
+        if name not in baseline['cases']:
+            continue
+        old_metrics = metrics(baseline['cases'][name])
+        for metric, new in metrics(case).items():
+            old = old_metrics.get(metric)
+            if not old or new <= old * (1 + threshold):
+                continue
+            if metric.endswith(' s') and new - old < MIN_SIGNIFICANT_SECONDS:
+                continue
+            found.append(f'{name}: {metric} {old:.6g} -> {new:.6g} (+{(new / old - 1) * 100:.0f}%)')
+    return found
+
+
+def print_results(results: dict, baseline: typing.Optional[dict] = None):
+    print(f'{"case":24} ' + ' '.join(f'{stage + " ms":>16}' for stage in STAGES)
+          + f' {"total ms":>10} {"renders/s":>9} {"peak MiB":>8}')
+    for name, case in results['cases'].items():
+        old = (baseline or {}).get('cases', {}).get(name)
+
+        def cell(new: float, previous: typing.Optional[float], width: int, scale: float = 1000) -> str:
+            text = f'{new * scale:.2f}'
+            if previous:
+                text += f' ({(new / previous - 1) * 100:+.0f}%)'
+            return f'{text:>{width}}'
+
+        print(f'{name:24} '
+              + ' '.join(cell(case['stages'][stage], old and old['stages'].get(stage), 16) for stage in STAGES)
+              + f' {cell(case["total"], old and old["total"], 10)} {case["renders_per_second"]:>9.1f}'
+              + f' {case["peak_memory"] / 2 ** 20:>8.1f}')
+
+
+def main(argv=None) -> int:
+    argument_parser = argparse.ArgumentParser(description='Time every stage of rendering the bundled characters')
+    argument_parser.add_argument('-t', '--template', default='character_sheet_light.pdf', help='template PDF')
+    argument_parser.add_argument('-r', '--repeat', type=int, default=DEFAULT_REPEAT, help='timed renders per case')
+    argument_parser.add_argument('--scale', action='append', default=None,
+                                 help=f'FEATURESxITEMS copy of {SCALED_SOURCE}, may be repeated, '
+                                      f'{" and ".join(DEFAULT_SCALES)} by default, 0 for none')
+    argument_parser.add_argument('-o', '--output', default=None, help='save the results as JSON')
+    argument_parser.add_argument('-b', '--baseline', default=None, help='JSON results to compare with')
+    argument_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                 help='relative slowdown or memory growth reported as a regression')
+    arguments = argument_parser.parse_args(argv)
+
+    scales = [scale for scale in (arguments.scale or DEFAULT_SCALES) if scale != '0']
+    with tempfile.TemporaryDirectory() as directory:
+        cases = {os.path.splitext(xml)[0]: xml for xml in BUNDLED_XMLS}
+        for scale in scales:
+            features, items = (int(size) for size in scale.lower().split('x'))
+            xml_path = scaled_xml(SCALED_SOURCE, features, items, directory)
+            cases[os.path.splitext(os.path.basename(xml_path))[0]] = xml_path
+        results = run(cases, arguments.template, arguments.repeat)
+
+    baseline = None
+    if arguments.baseline:
+        with open(arguments.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if baseline is None:
+        return 0
+    found = regressions(results, baseline, arguments.threshold)
+    for regression in found:
+        print(f'REGRESSION {regression}')
+    print(f'{len(found)} regressions over {arguments.threshold:.0%} compared with {arguments.baseline}')
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Measures open_connection_and_fetch_spells against the local replay of dungeon.su (benchmarks.spell_site):
+spells per second and CPU time per spell for a whole batch, and p50 / p99 latency of single spells fetched
+through one SpellClient by as many workers as requests allowed in flight. The site runs in its own process,
+so its work is not counted as ours. Every scenario asks for different spell names and uses no cache and no index,
+so every spell is downloaded and parsed. Run from the repository root:
+python -m benchmarks.spell_fetch_benchmark
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import socket
+import statistics
+import time
+import typing
+import urllib.request
+
+import SiteParser
+from SiteParser import SpellClient, open_connection_and_fetch_spells
+from benchmarks.spell_site import FIXTURES_DIRECTORY, SPELLS_PATH, STATS_PATH, ReplaySite, SiteConditions
+from spell_cache import SpellCache
+
+SCENARIOS = {
+    'replay': SiteConditions(wildcard=True),  # as fast as the site can answer
+    'latency': SiteConditions(latency=0.015, jitter=0.01, wildcard=True, seed=1),  # 15 to 25 ms per answer
+    'errors': SiteConditions(latency=0.005, error_rate=0.05, wildcard=True, seed=1),  # 5% answered with 500
+    'throttled': SiteConditions(latency=0.005, max_concurrent=4, wildcard=True),  # 503 for more than 4 at a time
+}
+NO_CACHE = SpellCache(path='')
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(conditions: SiteConditions, port: int):
+    from aiohttp import web
+    web.run_app(ReplaySite(FIXTURES_DIRECTORY, conditions).app(), host='127.0.0.1', port=port, print=None,
+                access_log=None)
+
+
+@contextlib.contextmanager
+def replay_site(conditions: SiteConditions) -> typing.Iterator[str]:
+    """
+    Runs the site in a child process
+    :return: its base URL
+    """
+    port = free_port()
+    process = multiprocessing.Process(target=serve, args=(conditions, port), daemon=True)
+    process.start()
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        process.terminate()
+        process.join()
+
+
+def percentile(values: typing.List[float], percent: int) -> float:
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+async def measure_batch(names: typing.List[str], max_in_flight: int) -> typing.Tuple[int, float, float]:
+    """
+    :return: spells fetched, wall and CPU seconds
+    """
+    started, cpu_started = time.perf_counter(), time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):  # failures are printed
+        spells = await open_connection_and_fetch_spells(names, cache=NO_CACHE, max_in_flight=max_in_flight)
+    return len(spells), time.perf_counter() - started, time.process_time() - cpu_started
+
+
+async def measure_latencies(names: typing.List[str], max_in_flight: int) -> typing.List[float]:
+    """
+    Latency of single spells: max_in_flight workers fetch one spell after another, so the time of a spell does not
+    include waiting behind the rest of the batch
+    """
+    queue = list(reversed(names))
+    latencies = []
+
+    async def worker(client: SpellClient):
+        while queue:
+            name = queue.pop()
+            started = time.perf_counter()
+            await client.fetch_spell(name)
+            latencies.append(time.perf_counter() - started)
+
+    async with SpellClient(cache=NO_CACHE, max_in_flight=max_in_flight) as client:
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*[worker(client) for _ in range(max_in_flight)])
+    return latencies
+
+
+def run_scenario(name: str, conditions: SiteConditions, spells: int, max_in_flight: int) -> dict:
+    with replay_site(conditions) as url:
+        SiteParser.SPELLS_URL = url + SPELLS_PATH
+        asyncio.run(measure_batch(['warm up'], max_in_flight))
+        fetched, wall, cpu = asyncio.run(measure_batch([f'{name} batch {i}' for i in range(spells)], max_in_flight))
+        latencies = asyncio.run(measure_latencies([f'{name} single {i}' for i in range(spells)], max_in_flight))
+        with urllib.request.urlopen(url + STATS_PATH) as response:
+            site_stats = json.load(response)
+    return {'scenario': name,
+            'fetched': fetched,
+            'spells_per_second': fetched / wall,
+            'cpu_ms_per_spell': cpu / max(fetched, 1) * 1000,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'site': site_stats}
+
+
+def main(argv=None):
+    argument_parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argument_parser.add_argument('-n', '--spells', type=int, default=200, help='spells per batch')
+    argument_parser.add_argument('--max-in-flight', type=int, default=SiteParser.DEFAULT_MAX_IN_FLIGHT)
+    argument_parser.add_argument('-s', '--scenario', action='append', choices=SCENARIOS,
+                                 help='scenario to run, may be repeated, all by default')
+    arguments = argument_parser.parse_args(argv)
+
+    original_url = SiteParser.SPELLS_URL
+    print(f'{arguments.spells} spells per batch, at most {arguments.max_in_flight} in flight')
+    print(f'{"scenario":10} {"fetched":>7} {"spells/s":>9} {"CPU ms/spell":>12} {"p50 ms":>8} {"p99 ms":>8}  site')
+    try:
+        for name in arguments.scenario or SCENARIOS:
+            result = run_scenario(name, SCENARIOS[name], arguments.spells, arguments.max_in_flight)
+            print(f'{name:10} {result["fetched"]:>7} {result["spells_per_second"]:>9.1f} '
+                  f'{result["cpu_ms_per_spell"]:>12.2f} {result["p50_ms"]:>8.1f} {result["p99_ms"]:>8.1f}  '
+                  f'{result["site"]}')
+    finally:
+        SiteParser.SPELLS_URL = original_url
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Compares the restricted article parse of spell search pages with the original full BeautifulSoup parse.
+Checks that both produce identical Spell records for every saved page in benchmarks/fixtures/spells, then times
+them. The pages follow the markup of dungeon.su search results: a full site page (head, menus, sidebar, footer)
+around one or more schema.org/Article cards. Run from the repository root:
+python -m benchmarks.spell_parsing_benchmark
+"""
+import contextlib
+import glob
+import io
+import os
+import timeit
+import typing
+
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+from SiteParser import ARTICLE_TYPE, find_articles, spell_from_articles
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'spells')
+
+
+def legacy_find_articles(html_text: str) -> typing.List[Tag]:
+    html = BeautifulSoup(html_text, 'html.parser')
+    return html.find_all(name='div', attrs={'itemtype': ARTICLE_TYPE})
+
+
+def load_pages() -> typing.Dict[str, str]:
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIRECTORY, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return pages
+
+
+def parse_all(pages: typing.Dict[str, str], find) -> list:
+    with contextlib.redirect_stdout(io.StringIO()):  # not found and ambiguous pages print
+        return [spell_from_articles(find(html_text), name) for name, html_text in pages.items()]
+
+
+def main():
+    pages = load_pages()
+    legacy_spells = parse_all(pages, legacy_find_articles)
+    spells = parse_all(pages, find_articles)
+    for name, legacy_spell, spell in zip(pages, legacy_spells, spells):
+        if legacy_spell != spell:
+            raise AssertionError(f'{name}: {legacy_spell!r} != {spell!r}')
+    print(f'Identical spells for {len(pages)} pages, {sum(s is not None for s in spells)} of them with a spell')
+
+    number = 20
+    legacy_time = timeit.timeit(lambda: parse_all(pages, legacy_find_articles), number=number) / number
+    fast_time = timeit.timeit(lambda: parse_all(pages, find_articles), number=number) / number
+    per_page = 1000 / len(pages)
+    print(f'full parse:       {legacy_time * per_page:.2f} ms per page')
+    print(f'restricted parse: {fast_time * per_page:.2f} ms per page ({legacy_time / fast_time:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
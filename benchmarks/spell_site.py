@@ -0,0 +1,246 @@
+"""
+Local stand-in for the spell search of dungeon.su, so the fetch path of SiteParser can be benchmarked and checked
+without the site.
+
+record: saves the responses of the real site for the given spell names to a fixture directory, and lists them
+in its manifest.json together with the status of every response:
+    python -m benchmarks.spell_site record "hellish rebuke" fireball
+serve: replays a fixture directory with optional latency, errors and throttling:
+    python -m benchmarks.spell_site serve --latency 50 --error-rate 0.1 --max-concurrent 4
+    CHARACTER_SHEET_SPELLS_URL=http://127.0.0.1:8765/spells/ python parser.py ...
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+import typing
+import zlib
+from collections import namedtuple
+
+import aiohttp
+from aiohttp import web
+
+from SiteParser import ARTICLE_TYPE, DEFAULT_HEADERS, SPELLS_URL, SPELLS_URL_ENVIRONMENT_VARIABLE
+from spell_cache import normalize_name
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'spells')
+MANIFEST_FILE_NAME = 'manifest.json'  # normalized search text -> {"file": ..., "status": ...}
+OTHER_SEARCHES = '*'  # manifest entry answering the searches that were not recorded, usually "not found"
+SPELLS_PATH = '/spells/'
+STATS_PATH = '/stats'  # what the site has seen, as JSON
+DEFAULT_PORT = 8765
+
+RecordedResponse = namedtuple('RecordedResponse', ('status', 'body'))
+
+
+class SiteConditions:
+    """
+    What the replayed site does besides answering
+    """
+
+    def __init__(self, *,
+                 latency: float = 0,
+                 jitter: float = 0,
+                 error_rate: float = 0,
+                 error_status: int = 500,
+                 max_concurrent: typing.Optional[int] = None,
+                 rate: typing.Optional[float] = None,
+                 throttle_status: int = 503,
+                 wildcard: bool = False,
+                 seed: typing.Optional[int] = None):
+        """
+        :param latency: seconds before every answer
+        :param jitter: up to this many seconds are randomly added to latency
+        :param error_rate: share of requests answered with error_status
+        :param max_concurrent: requests over this many at a time are answered with throttle_status at once
+        :param rate: requests per second on average, in bursts of up to rate requests, the rest are throttled
+        :param wildcard: searches that were not recorded get one of the recorded single spell pages instead of
+            "not found", so a benchmark can ask for any number of different spells
+        :param seed: for the random latency and errors
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.throttle_status = throttle_status
+        self.wildcard = wildcard
+        self.random = random.Random(seed)
+
+
+class ReplaySite:
+    """
+    Serves recorded responses by the search parameter and counts what happened
+    """
+
+    def __init__(self, directory: str = FIXTURES_DIRECTORY, conditions: typing.Optional[SiteConditions] = None):
+        self.conditions = conditions or SiteConditions()
+        self.responses = load_recording(directory)
+        # pages with exactly one spell, for wildcard searches
+        self.single_spell_pages = [response for _, response in sorted(self.responses.items())
+                                   if response.status == 200 and response.body.count(ARTICLE_TYPE.encode()) == 1]
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.tokens = self.conditions.rate or 0
+        self.tokens_updated = time.monotonic()
+
+    def take_token(self) -> bool:
+        if self.conditions.rate is None:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.conditions.rate, self.tokens + (now - self.tokens_updated) * self.conditions.rate)
+        self.tokens_updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def find(self, search: str) -> RecordedResponse:
+        key = normalize_name(search)
+        if key in self.responses:
+            return self.responses[key]
+        if self.conditions.wildcard and self.single_spell_pages:
+            return self.single_spell_pages[zlib.crc32(key.encode()) % len(self.single_spell_pages)]
+        return self.responses.get(OTHER_SEARCHES, RecordedResponse(status=200, body=b'<html><body></body></html>'))
+
+    async def handle(self, request: web.Request) -> web.Response:
+        conditions = self.conditions
+        self.requests += 1
+        if (conditions.max_concurrent is not None and self.in_flight >= conditions.max_concurrent) \
+                or not self.take_token():
+            self.throttled += 1
+            return web.Response(status=conditions.throttle_status, headers={'Retry-After': '1'}, text='Slow down')
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = conditions.latency + conditions.random.uniform(0, conditions.jitter)
+            if delay:
+                await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+        if conditions.error_rate and conditions.random.random() < conditions.error_rate:
+            self.errors += 1
+            return web.Response(status=conditions.error_status, text='Injected error')
+
+        recorded = self.find(request.query.get('search', ''))
+        response = web.Response(status=recorded.status, body=recorded.body, content_type='text/html',
+                                charset='utf-8')
+        response.enable_compression()  # like the site, when the client accepts gzip
+        return response
+
+    def stats(self) -> typing.Dict[str, int]:
+        return {'requests': self.requests, 'errors': self.errors, 'throttled': self.throttled,
+                'max_in_flight': self.max_in_flight}
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(SPELLS_PATH, self.handle)
+        app.router.add_get(STATS_PATH, self.stats_handler)
+        return app
+
+
+def load_recording(directory: str) -> typing.Dict[str, RecordedResponse]:
+    with open(os.path.join(directory, MANIFEST_FILE_NAME), encoding='utf-8') as f:
+        manifest = json.load(f)
+    responses = {}
+    for search, entry in manifest.items():
+        with open(os.path.join(directory, entry['file']), 'rb') as f:
+            responses[normalize_name(search)] = RecordedResponse(status=entry.get('status', 200), body=f.read())
+    return responses
+
+
+def fixture_file_name(search: str) -> str:
+    return re.sub(r'\W+', '_', normalize_name(search)).strip('_') + '.html'
+
+
+async def record(spell_names: typing.List[str], directory: str = FIXTURES_DIRECTORY, url: str = SPELLS_URL,
+                 max_in_flight: int = 4) -> typing.Dict[str, dict]:
+    """
+    Saves what the site answers to every search, adding them to the manifest of the directory
+    :return: the updated manifest
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILE_NAME)
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def record_one(session: aiohttp.ClientSession, name: str):
+        async with semaphore, session.get(url, params={'search': name}) as response:
+            body = await response.read()
+        file_name = fixture_file_name(name)
+        with open(os.path.join(directory, file_name), 'wb') as f:
+            f.write(body)
+        manifest[normalize_name(name)] = {'file': file_name, 'status': response.status}
+        print(f'{name}: {response.status}, {len(body)} bytes -> {file_name}')
+
+    async with aiohttp.ClientSession(headers=DEFAULT_HEADERS) as session:
+        await asyncio.gather(*[record_one(session, name) for name in spell_names])
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(manifest.items())), f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+async def start(site: ReplaySite, host: str = '127.0.0.1', port: int = 0) -> typing.Tuple[web.AppRunner, str]:
+    """
+    Starts the site in the running event loop, port 0 picks a free one
+    :return: the runner to clean up when done, and the URL to put into SiteParser.SPELLS_URL
+    """
+    runner = web.AppRunner(site.app(), access_log=None)
+    await runner.setup()
+    tcp_site = web.TCPSite(runner, host, port)
+    await tcp_site.start()
+    port = runner.addresses[0][1]
+    return runner, f'http://{host}:{port}{SPELLS_PATH}'
+
+
+def main(argv=None) -> int:
+    argument_parser = argparse.ArgumentParser(description='Record dungeon.su spell searches and replay them locally')
+    argument_parser.add_argument('-d', '--directory', default=FIXTURES_DIRECTORY, help='fixture directory')
+    commands = argument_parser.add_subparsers(dest='command', required=True)
+    record_command = commands.add_parser('record', help='save the answers of the real site')
+    record_command.add_argument('names', nargs='+', help='English spell names to search for')
+    record_command.add_argument('--url', default=SPELLS_URL)
+    serve_command = commands.add_parser('serve', help='replay the saved answers')
+    serve_command.add_argument('--host', default='127.0.0.1')
+    serve_command.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_command.add_argument('--latency', type=float, default=0, help='milliseconds before every answer')
+    serve_command.add_argument('--jitter', type=float, default=0, help='up to this many milliseconds more')
+    serve_command.add_argument('--error-rate', type=float, default=0, help='share of requests answered with 500')
+    serve_command.add_argument('--max-concurrent', type=int, default=None,
+                               help='requests at a time, more are answered with 503')
+    serve_command.add_argument('--rate', type=float, default=None, help='requests per second, more get 503')
+    serve_command.add_argument('--wildcard', action='store_true',
+                               help='answer unknown searches with a recorded spell instead of "not found"')
+    arguments = argument_parser.parse_args(argv)
+
+    if arguments.command == 'record':
+        asyncio.run(record(arguments.names, arguments.directory, arguments.url))
+        return 0
+    site = ReplaySite(arguments.directory, SiteConditions(latency=arguments.latency / 1000,
+                                                          jitter=arguments.jitter / 1000,
+                                                          error_rate=arguments.error_rate,
+                                                          max_concurrent=arguments.max_concurrent,
+                                                          rate=arguments.rate,
+                                                          wildcard=arguments.wildcard))
+    print(f'Serving {len(site.responses)} recorded searches, '
+          f'set {SPELLS_URL_ENVIRONMENT_VARIABLE}=http://{arguments.host}:{arguments.port}{SPELLS_PATH}')
+    web.run_app(site.app(), host=arguments.host, port=arguments.port, print=None)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,313 @@
+import operator
+import re
+import typing
+from collections import namedtuple
+
+DefaultNamedtuple = namedtuple('Default', ())
+AbilitiesTranslation = namedtuple('AbilitiesTranslation', ('strength', 'dexterity', 'constitution', 'intelligence',
+                                                           'wisdom', 'charisma'))
+Cases = namedtuple('Падеж', ('именительный', 'родительный', 'дательный', 'винительный', 'творительный', 'предложный'))
+abilities_translation = AbilitiesTranslation(strength=Cases(именительный='сила',
+                                                            родительный='силы',
+                                                            дательный='силе',
+                                                            винительный='силу',
+                                                            творительный='силой',
+                                                            предложный='силе'),
+                                             dexterity=Cases(именительный='ловкость',
+                                                             родительный='ловкости',
+                                                             дательный='ловкости',
+                                                             винительный='ловкость',
+                                                             творительный='ловкостью',
+                                                             предложный='ловкости'),
+                                             constitution=Cases(именительный='телосложение',
+                                                                родительный='телосложения',
+                                                                дательный='телосложению',
+                                                                винительный='телосложение',
+                                                                творительный='телосложением',
+                                                                предложный='телосложении'),
+                                             intelligence=Cases(именительный='интеллект',
+                                                                родительный='интеллекта',
+                                                                дательный='интеллекту',
+                                                                винительный='интеллект',
+                                                                творительный='интеллектом',
+                                                                предложный='интеллекте'),
+                                             wisdom=Cases(именительный='мудрость',
+                                                          родительный='мудрости',
+                                                          дательный='мудрости',
+                                                          винительный='мудрость',
+                                                          творительный='мудростью',
+                                                          предложный='мудрости'),
+                                             charisma=Cases(именительный='харизма',
+                                                            родительный='харизмы',
+                                                            дательный='харизме',
+                                                            винительный='харизму',
+                                                            творительный='харизмой',
+                                                            предложный='харизме'))
+
+DAMAGE_TRANSLATIONS = {'slashing': 'рубящий',
+                       'piercing': 'колющий',
+                       'bludgeoning': 'дробящий',
+                       'cold': 'холод',
+                       'acid': 'кислота',
+                       'fire': 'огонь',
+                       'magic': 'магический',
+                       'poison': 'яд',
+                       'force': 'сил. поле',
+                       'necrotic': 'некротика',
+                       'lightning': 'молния',
+                       'psychic': 'психический',
+                       'radiant': 'излучение',
+                       'thunder': 'звук',
+                       }
+
+LANGUAGE_TRANSLATIONS = {'Common': 'Общий',
+                         'Dwarvish': 'Дворфский',
+                         'Elvish': 'Эльфийский',
+                         'Abyssal': 'Бездны',
+                         'Aquan': 'Водный',
+                         'Celestial': 'Небесный',
+                         'Deep Speech': 'Глубинный',
+                         'Draconic': 'Драконий',
+                         'Giant': 'Великаний',
+                         'Gnomish': 'Гномий',
+                         'Goblin': 'Гоблинский',
+                         'Halfling': 'Полуросликов',
+                         'Ingan': 'Огненный',
+                         'Infernal': 'Инфернальный',
+                         'Orc': 'Орочий',
+                         'Primordal': 'Первородный',
+                         'Sylvan': 'Лесной',
+                         'Terran': 'Земной',
+                         'UnderCommon': 'Глубинный Общий'}
+
+# What a binding produces: layout slot, text to write and the font size forced for it (None to let the slot decide)
+SlotValue = namedtuple('SlotValue', ('slot', 'value', 'fixed_font_size'))
+
+
+class Binding(typing.NamedTuple):
+    """
+    One layout slot filled from the character.
+    source is a dotted path inside character.xml ('abilities.strength.bonus') or a callable taking character.xml.
+    transform turns the found value into the text to write, None from it means nothing is written
+    """
+    slot: str
+    source: typing.Union[str, typing.Callable]
+    transform: typing.Optional[typing.Callable] = None
+    fixed_font_size: typing.Optional[int] = None
+
+
+class BindingGroup(typing.NamedTuple):
+    """
+    Several slots computed together, e.g. the feature list. generate takes character.xml and yields SlotValues
+    """
+    name: str
+    generate: typing.Callable[..., typing.Iterable[SlotValue]]
+
+
+def checkmark(value) -> typing.Optional[str]:
+    return 'v' if value == '1' else None
+
+
+def speed_in_cells(value) -> str:
+    return str(int(value) // 5)
+
+
+def class_level_text(xml) -> str:
+    return ', '.join(f'{class_.name} {class_.level}' for class_ in xml.classes)
+
+
+def hit_dice(xml) -> typing.List[str]:
+    dice = []
+    for class_ in xml.classes:
+        dice.extend(str((class_.hddie + ' ') * int(class_.level)).split())
+    return dice
+
+
+def spellcasting_ability_name(xml) -> str:
+    spellcasting_ability_string = None
+    for feature_name in xml.featurelist._asdict().keys():
+        if 'spellcasting' in feature_name:
+            spellcasting_ability_text = getattr(xml.featurelist, feature_name).text
+            spellcasting_ability_string = re.search(r'(\w+) is your spellcasting ability', spellcasting_ability_text)
+            if spellcasting_ability_string:
+                spellcasting_ability_string = spellcasting_ability_string.group(1).lower()
+            else:
+                spellcasting_ability_string = None
+
+    return spellcasting_ability_string or 'intelligence'
+
+
+def spellcasting_lines(xml) -> typing.Iterator[SlotValue]:
+    spellcasting_ability_string = spellcasting_ability_name(xml)
+    spellcasting_ability = getattr(xml.abilities, spellcasting_ability_string)
+    ability_genitive = getattr(abilities_translation, spellcasting_ability_string).родительный.capitalize()
+
+    magic_attacks_modifier = int(xml.profbonus) + int(spellcasting_ability.bonus)
+    if magic_attacks_modifier > 0:
+        magic_attacks_modifier = '+' + str(magic_attacks_modifier)
+
+    yield SlotValue('magic1', f'Модификатор магических атак: {magic_attacks_modifier}', 6)
+    yield SlotValue('magic2', f'Бонус мастерства ({xml.profbonus}) + '
+                              f'Модификатор {ability_genitive} ({spellcasting_ability.bonus})', 6)
+    yield SlotValue('magic3', f'Сложность спасброска: {10 + int(spellcasting_ability.bonus)}', 6)
+    yield SlotValue('magic4', f'10 + Модификатор {ability_genitive} ({spellcasting_ability.bonus})', 6)
+    yield SlotValue('magic5', f'Атака: Бонус мастерства ({xml.profbonus}), если проф. владение+', 6)
+    yield SlotValue('magic6', f'Модификатор Силы({xml.abilities.strength.bonus}) или '
+                              f'Ловкости({xml.abilities.dexterity.bonus}), если фехтовальное', 6)
+    yield SlotValue('magic7', f'Урон: Модификатор Силы ({xml.abilities.strength.bonus}) или '
+                              f'Ловкости({xml.abilities.dexterity.bonus}), если фехтовальное', 5)
+
+
+def armor_class_line(xml) -> str:
+    dexterity_included = xml.abilities.dexterity.bonus
+    if getattr(xml.defenses.ac, 'dexbonus', None) == 'no':
+        dexterity_included = 'no'
+
+    ac_string = f'КД: Осн(10) + Броня({xml.defenses.ac.armor}) + ' \
+        f'Ловк({dexterity_included}) + Щит({xml.defenses.ac.shield})'
+    if xml.defenses.ac.misc != 0:
+        ac_string += f' + Доп({xml.defenses.ac.misc})'
+    return ac_string
+
+
+def feature_rows(text_to_write: str, number: int) -> typing.Iterator[SlotValue]:
+    # every feature takes two rows of the list, the second one only if the text does not fit into the first
+    if len(text_to_write) > 64:
+        yield SlotValue(f'feature{number * 2 - 1}', text_to_write[:64], 5)
+        yield SlotValue(f'feature{number * 2}', text_to_write[64:], 5)
+    else:
+        yield SlotValue(f'feature{number * 2 - 1}', text_to_write, 5)
+
+
+def feature_lines(xml) -> typing.Iterator[SlotValue]:
+    # one feature without a value must not blank the whole list, so every feature is checked on its own
+    feature_list_position = 0
+    for number, feature in enumerate(getattr(xml, 'featurelist', ()), 1):
+        feature_list_position += 1
+        try:
+            text_to_write = str(feature.name)
+        except AttributeError as e:
+            print(e)
+            continue
+        source = getattr(feature, 'source', None)
+        if source:
+            text_to_write += f' (от {source} {getattr(feature, "level", "")})'
+        yield from feature_rows(text_to_write, number)
+
+    for number, feature in enumerate(getattr(xml, 'featlist', ()), feature_list_position + 1):
+        if not hasattr(feature, 'name'):
+            continue
+        yield from feature_rows(f'{feature.name} (черта)', number)
+
+
+def language_lines(xml) -> typing.Iterator[SlotValue]:
+    for number, language in enumerate(xml.languagelist, 1):
+        try:
+            language_name = language.name.strip()
+        except AttributeError as e:
+            print(e)
+            continue
+        language_name = LANGUAGE_TRANSLATIONS.get(language_name, language_name)
+        yield SlotValue(f'language{number}', f'{language_name} язык', None)
+
+
+ABILITY_SLOTS = (('strength', 'strength'),
+                 ('dexterity', 'dexterity'),
+                 ('constitution', 'constitution'),
+                 ('intelligence', 'intellect'),
+                 ('wisdom', 'wisdom'),
+                 ('charisma', 'charisma'))
+
+# skill in skilllist -> slot prefix on the sheet, in the order of the sheet
+SKILL_SLOTS = (('acrobatics', 'acrobatics'),
+               ('investigation', 'investigation'),
+               ('athletics', 'athletic'),
+               ('perception', 'perception'),
+               ('survival', 'survival'),
+               ('performance', 'performance'),
+               ('intimidation', 'intimidation'),
+               ('history', 'history'),
+               ('sleight_of_hand', 'sleight_of_hand'),
+               ('arcana', 'arcana'),
+               ('medicine', 'medicine'),
+               ('deception', 'deception'),
+               ('nature', 'nature'),
+               ('insight', 'insight'),
+               ('religion', 'religion'),
+               ('stealth', 'stealth'),
+               ('persuasion', 'persuasion'),
+               ('animal_handling', 'animal_handling'))
+
+# Skill totals ('skilllist.<skill>.total' -> '<slot>') and weapons (weapon0..2 slots, damage types from
+# DAMAGE_TRANSLATIONS) are not printed yet
+BINDINGS = (
+    (Binding('name', 'name'),) +
+    tuple(binding for ability, slot in ABILITY_SLOTS for binding in (
+        Binding(slot, f'abilities.{ability}.bonus'),
+        Binding(f'{slot}.value', f'abilities.{ability}.score'))) +
+    (Binding('passive_perception', 'perception'),
+     Binding('profbonus', 'profbonus')) +
+    tuple(Binding(f'{slot}.saveprof', f'abilities.{ability}.saveprof', checkmark) for ability, slot in ABILITY_SLOTS) +
+    tuple(Binding(f'{slot}.save', f'abilities.{ability}.save') for ability, slot in ABILITY_SLOTS) +
+    tuple(Binding(f'{slot}.prof', f'skilllist.{skill}.prof', checkmark) for skill, slot in SKILL_SLOTS) +
+    (Binding('armor', 'defenses.ac.total'),
+     Binding('initiative', 'initiative.total'),
+     Binding('speed', 'speed.total', speed_in_cells),
+     Binding('class_level', class_level_text),
+     Binding('race', 'race'),
+     Binding('alignment', 'alignment'),
+     Binding('background', 'background'),
+     Binding('hp_max', 'hp.total'),
+     Binding('total_dice', hit_dice, lambda dice: str(len(dice))),
+     Binding('dice', hit_dice, ' '.join),
+     BindingGroup('spellcasting', spellcasting_lines),
+     Binding('magic8', armor_class_line, fixed_font_size=6),
+     BindingGroup('features', feature_lines),
+     BindingGroup('languages', language_lines))
+)
+
+# A binding can fail only because the character lacks the data: a missing section or skill, an empty number
+MISSING_VALUE_ERRORS = (AttributeError, ValueError)
+
+
+def compile_binding(binding: typing.Union[Binding, BindingGroup]) -> typing.Callable:
+    """
+    Turns a table entry into a function of character.xml returning the SlotValues to write
+    """
+    if isinstance(binding, BindingGroup):
+        return lambda xml: list(binding.generate(xml))
+
+    getter = operator.attrgetter(binding.source) if isinstance(binding.source, str) else binding.source
+    transform = binding.transform
+    slot, fixed_font_size = binding.slot, binding.fixed_font_size
+
+    def evaluate(xml):
+        value = getter(xml)
+        if transform is not None:
+            value = transform(value)
+        if value is None:
+            return ()
+        return SlotValue(slot, value, fixed_font_size),
+
+    return evaluate
+
+
+def compile_bindings(bindings=BINDINGS) -> typing.Tuple[typing.Callable, ...]:
+    return tuple(compile_binding(binding) for binding in bindings)
+
+
+compiled_bindings = compile_bindings()
+
+
+def evaluate_bindings(xml, compiled: typing.Iterable[typing.Callable] = compiled_bindings) \
+        -> typing.Iterator[SlotValue]:
+    """
+    Evaluates every compiled binding in a single pass. A binding whose data is missing in the character
+    is skipped alone and does not affect the others
+    """
+    for evaluate in compiled:
+        try:
+            values = evaluate(xml)
+        except MISSING_VALUE_ERRORS:
+            continue
+        yield from values
@@ -0,0 +1,93 @@
+import argparse
+import os
+import re
+import sys
+import typing
+import xml.etree.ElementTree as ElementTree
+
+import parser
+
+RECORD_TAGS = ('character',)  # single character exports and campaign databases with <character> records
+RECORD_CONTAINER_TAGS = ('charsheet',)  # campaign db.xml keeps player characters as <charsheet><id-00001>...
+
+
+def iter_characters(source,
+                    record_tags: typing.Iterable[str] = RECORD_TAGS,
+                    record_container_tags: typing.Iterable[str] = RECORD_CONTAINER_TAGS) \
+        -> typing.Iterator[parser.Character]:
+    """
+    Streams characters out of a Fantasy Grounds export or a whole campaign db.xml with iterparse.
+    A record is detached from the tree as soon as it is yielded and everything outside records is cleared
+    while parsing, so memory stays flat however big the campaign is. Each Character keeps only its own element
+    :param source: file name or binary file object
+    :param record_tags: tags of character records
+    :param record_container_tags: tags whose direct children are character records
+    :return:
+    """
+    record_tags = set(record_tags)
+    record_container_tags = set(record_container_tags)
+    stack = []  # type: typing.List[ElementTree.Element]
+    record_depth = None  # depth of the record being parsed, None outside records
+
+    for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if record_depth is None and (element.tag in record_tags or
+                                         (stack and stack[-1].tag in record_container_tags)):
+                record_depth = len(stack)
+            stack.append(element)
+            continue
+
+        stack.pop()
+        if record_depth is None:
+            element.clear()  # campaign data we do not render: images, npcs, encounters...
+        elif len(stack) == record_depth:
+            record_depth = None
+            if stack:
+                stack[-1].remove(element)
+            yield parser.Character.from_element(element)
+
+
+def safe_file_name(name: str) -> str:
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', name).strip('_') or 'character'
+
+
+def render_campaign(source, output_dir: str, template_filename: str = 'character_sheet_light.pdf',
+                    skip_name: bool = False) -> typing.List[str]:
+    """
+    Renders every character of a campaign into output_dir, one character in memory at a time
+    :return: paths of the written PDFs
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    used_names = set()
+    for number, character in enumerate(iter_characters(source), 1):
+        base_name = file_name = safe_file_name(str(getattr(character.xml, 'name', '')))
+        suffix = number
+        while file_name.lower() in used_names:  # "Bob", "Bob" after a character named "Bob_3"
+            file_name = f'{base_name}_{suffix}'
+            suffix += 1
+        used_names.add(file_name.lower())
+        pdf_path = os.path.join(output_dir, f'{file_name}.pdf')
+        try:
+            parser.render_character(character, pdf_path, template=template_filename, skip_name=skip_name)
+        except Exception as e:
+            print(f'Cannot render character #{number} "{file_name}": {type(e).__name__}: {e}')
+            continue
+        print(f'Character #{number} rendered into {pdf_path}')
+        written.append(pdf_path)
+    return written
+
+
+def main(argv=None) -> int:
+    argument_parser = argparse.ArgumentParser(description='Render every character of a campaign db.xml')
+    argument_parser.add_argument('db', help='campaign db.xml or a single character export')
+    argument_parser.add_argument('-o', '--output-dir', default='.', help='where to put PDFs')
+    argument_parser.add_argument('-t', '--template', default='character_sheet_light.pdf', help='template PDF')
+    argument_parser.add_argument('--skip-name', action='store_true', help='leave the character name empty')
+    arguments = argument_parser.parse_args(argv)
+    render_campaign(arguments.db, arguments.output_dir, arguments.template, arguments.skip_name)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
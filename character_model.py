@@ -0,0 +1,232 @@
+import functools
+import keyword
+import typing
+import xml.etree.ElementTree as ElementTree
+
+from fantasy_grounds_codec import translate_from_iso_codes
+
+KEY_PREFIX = 'key_'  # for names that cannot start an attribute name, e.g. "2nd wind"
+
+
+class Node:
+    """
+    Base of the character tree nodes. Behaves like the namedtuples the tree used to be built from:
+    attributes for every child tag, iteration over the values, len, indexing and _asdict(). A child that is
+    missing in the XML raises AttributeError, so hasattr checks keep working
+    """
+    __slots__ = ()
+    _fields = ()  # type: typing.Tuple[str, ...]
+
+    def __init__(self, **values):
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def _present_fields(self) -> typing.Iterator[str]:
+        for name in self._fields:
+            if hasattr(self, name):
+                yield name
+
+    def _asdict(self) -> dict:
+        return {name: getattr(self, name) for name in self._present_fields()}
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self._present_fields())
+
+    def __len__(self):
+        return sum(1 for _ in self._present_fields())
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._asdict() == other._asdict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={value!r}' for name, value in self._asdict().items())
+        return f'{type(self).__name__}({values})'
+
+
+def node_class(name: str, fields: typing.Tuple[str, ...]) -> typing.Type[Node]:
+    return type(name, (Node,), {'__slots__': fields, '_fields': fields})
+
+
+Abilities = node_class('Abilities', ('strength', 'dexterity', 'constitution', 'intelligence', 'wisdom', 'charisma'))
+Ability = node_class('Ability', ('bonus', 'save', 'savemodifier', 'saveprof', 'score'))
+Skill = node_class('Skill', ('name', 'stat', 'prof', 'misc', 'total'))
+Feature = node_class('Feature', ('name', 'source', 'level', 'locked', 'specializationchoice', 'text'))
+Trait = node_class('Trait', ('name', 'source', 'type', 'locked', 'text'))
+Feat = node_class('Feat', ('name', 'locked', 'text'))
+Weapon = node_class('Weapon', ('name', 'type', 'prof', 'attackstat', 'attackbonus', 'damagelist', 'properties',
+                               'carried', 'isidentified', 'maxammo', 'shortcut'))
+Damage = node_class('Damage', ('dice', 'stat', 'bonus', 'type'))
+InventoryItem = node_class('InventoryItem', ('name', 'type', 'subtype', 'count', 'cost', 'weight', 'ac', 'bonus',
+                                             'damage', 'dexbonus', 'stealth', 'strength', 'properties',
+                                             'description', 'carried', 'isidentified', 'locked'))
+CharacterClass = node_class('CharacterClass', ('name', 'level', 'hddie', 'hdused', 'casterlevelinvmult',
+                                               'casterpactmagic', 'shortcut'))
+Language = node_class('Language', ('name',))
+Proficiency = node_class('Proficiency', ('name',))
+HitPoints = node_class('HitPoints', ('total', 'wounds', 'temporary'))
+Initiative = node_class('Initiative', ('total', 'misc', 'temporary'))
+Speed = node_class('Speed', ('total', 'base', 'armor', 'misc', 'temporary'))
+Defenses = node_class('Defenses', ('ac',))
+ArmorClass = node_class('ArmorClass', ('total', 'armor', 'shield', 'dexbonus', 'misc', 'prof', 'temporary',
+                                       'disstealth'))
+Link = node_class('Link', ('class_', 'recordname'))
+CharacterRecord = node_class('CharacterRecord', (
+    'name', 'race', 'racelink', 'size', 'level', 'exp', 'expneeded', 'background', 'backgroundlink', 'alignment',
+    'deity', 'gender', 'age', 'height', 'weight', 'appearance', 'personalitytraits', 'ideals', 'bonds', 'flaws',
+    'notes', 'token', 'abilities', 'classes', 'hp', 'initiative', 'speed', 'defenses', 'perception',
+    'perceptionmodifier', 'profbonus', 'skilllist', 'featurelist', 'traitlist', 'featlist', 'proficiencylist',
+    'languagelist', 'weaponlist', 'inventorylist', 'coins', 'encumbrance', 'powers', 'powergroup', 'powermeta',
+    'powermode', 'powerdisplaymode', 'adventurelist', 'temp'))
+
+# children of these list sections all have the same structure
+ITEM_CLASSES = {'abilities': Ability,
+                'skilllist': Skill,
+                'featurelist': Feature,
+                'traitlist': Trait,
+                'featlist': Feat,
+                'weaponlist': Weapon,
+                'damagelist': Damage,
+                'inventorylist': InventoryItem,
+                'classes': CharacterClass,
+                'languagelist': Language,
+                'proficiencylist': Proficiency,
+                }
+
+SECTION_CLASSES = {'character': CharacterRecord,
+                   'abilities': Abilities,
+                   'hp': HitPoints,
+                   'initiative': Initiative,
+                   'speed': Speed,
+                   'defenses': Defenses,
+                   'ac': ArmorClass,
+                   'backgroundlink': Link,
+                   'racelink': Link,
+                   'shortcut': Link,
+                   }
+
+
+@functools.lru_cache(maxsize=4096)
+def generic_class(fields: typing.Tuple[str, ...]) -> typing.Type[Node]:
+    """
+    One class per key-set for sections without a schema, e.g. featurelist, whose children are named after features
+    """
+    return node_class('GenericDict', fields)
+
+
+def schema_class(key: str, parent_key: str, fields: typing.Tuple[str, ...]) -> typing.Type[Node]:
+    cls = ITEM_CLASSES.get(parent_key) or SECTION_CLASSES.get(key)
+    if cls is not None and set(fields).issubset(cls._fields):
+        return cls
+    return generic_class(fields)
+
+
+def build_node(dictionary: dict, key: str = 'character', parent_key: str = ''):
+    """
+    Recursively converts the dictionary made by Character.element_to_dict into Node objects
+    :param dictionary: dict to convert
+    :param key: tag of the element the dictionary was made from, selects the schema class
+    :param parent_key: tag of the parent element, selects the schema class for list items
+    :return: Node, or the text for a leaf element
+    """
+    values = {}
+    for child_key, value in dictionary.items():
+        if not isinstance(value, dict):
+            return value
+        values[child_key] = build_node(value, child_key, key)
+
+    return schema_class(key, parent_key, tuple(values))(**values)
+
+
+def element_key(element: ElementTree.Element) -> str:
+    """
+    Attribute name for the element: list items (id-00001) are named after their <name> child
+    """
+    tag = element.tag
+    if tag.startswith('id-'):
+        name_child = [e for e in element if e.tag == 'name']
+        if name_child:
+            tag = translate_from_iso_codes(name_child[0].text). \
+                lower(). \
+                replace(' ', '_'). \
+                replace('(', ''). \
+                replace(')', ''). \
+                replace(':', ''). \
+                replace(',', ''). \
+                replace('.', '')
+    return identifier(tag)
+
+
+def identifier(key: str) -> str:
+    """
+    Makes the key usable as an attribute (a __slots__ name): "hunter's prey" -> hunter_s_prey, class -> class_,
+    "2nd wind" -> key_2nd_wind. Names starting with _ are kept for Node internals
+    """
+    key = ''.join(character if f'a{character}'.isidentifier() else '_' for character in key)
+    if keyword.iskeyword(key):
+        return key + '_'
+    if not key.isidentifier() or key.startswith('_'):
+        return KEY_PREFIX + key
+    return key
+
+
+def element_to_dict(element: ElementTree.Element, key: typing.Optional[str] = None) -> dict:
+    dict_to_return = {}
+    if key is None:
+        key = element_key(element)
+    if list(element) and key != 'text':
+        for e in list(element):
+            child_key = element_key(e)
+            dict_to_return[child_key] = element_to_dict(e, child_key)
+    else:
+        text = element.text
+        if key == 'text':
+            text = ' '.join([t.text for t in list(element) if t.text])
+        dict_to_return[key] = translate_from_iso_codes(text)
+    return dict_to_return
+
+
+def character_element(root: ElementTree.Element) -> ElementTree.Element:
+    characters = [e for e in root if element_key(e) == 'character']
+    if not characters:
+        raise ValueError(f'No <character> element in <{root.tag}>')
+    return characters[-1]
+
+
+class LazyRecord(Node):
+    """
+    View over a parsed <character> element. Every top-level section is decoded and converted the first
+    time it is accessed and then memoized, so a render never pays for sections it does not print
+    """
+    __slots__ = ('_elements', '_decoded')
+
+    def __init__(self, element: ElementTree.Element):
+        super().__init__()
+        self._elements = {element_key(child): child for child in element}  # last one wins, as in element_to_dict
+        self._decoded = {}
+
+    @property
+    def _fields(self) -> typing.Tuple[str, ...]:
+        return tuple(self._elements)
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._decoded[name]
+        except KeyError:
+            pass
+        try:
+            element = self._elements[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        value = build_node(element_to_dict(element, name), name, 'character')
+        self._decoded[name] = value
+        return value
+
+    def __len__(self):
+        return len(self._elements)
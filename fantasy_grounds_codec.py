@@ -0,0 +1,69 @@
+"""
+Fantasy Grounds stores Russian text as Windows-1251 bytes inside iso-8859-1 XML, either as raw characters
+or as &#NNN; entities. Both directions are table driven: one str.translate call per text, and one regex pass
+for the entities that are left. Registered as the "fantasy_grounds" codec, so bytes.decode('fantasy_grounds')
+and str.encode('fantasy_grounds') work as well
+"""
+import codecs
+import re
+
+RUSSIAN_LETTERS = 'АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯабвгдежзийклмнопрстуфхцчшщъыьэюя'
+FIRST_LETTER_CODE = 192
+CODEC_NAME = 'fantasy_grounds'
+
+# latin-1 character -> Russian letter. '?' is how FG exports 'ё' that did not fit into its code page
+FROM_ISO_TABLE = {FIRST_LETTER_CODE + position: letter for position, letter in enumerate(RUSSIAN_LETTERS)}
+FROM_ISO_TABLE.update({184: 'ё', ord('?'): 'ё', 168: 'Ё'})
+
+TO_ISO_TABLE = {ord(letter): f'&#{FIRST_LETTER_CODE + position};' for position, letter in enumerate(RUSSIAN_LETTERS)}
+TO_ISO_TABLE.update({ord('ё'): '&#184;', ord('Ё'): '&#168;'})
+
+ENTITY_PATTERN = re.compile('&#(.+?);')
+SPECIAL_ENTITIES = {'8226': '•',
+                    '8212': '—',
+                    '8722': '−',
+                    '8217': '’',
+                    '8211': '–',
+                    '184': 'ё',
+                    }
+
+
+def entity_to_letter(match: re.Match) -> str:
+    code = match.group(1)
+    if code in SPECIAL_ENTITIES:
+        return SPECIAL_ENTITIES[code]
+    return RUSSIAN_LETTERS[int(code) - FIRST_LETTER_CODE]
+
+
+def translate_from_iso_codes(text: str) -> str:
+    if isinstance(text, int):
+        return str(text)
+
+    if not text:
+        return ''
+
+    text = text.translate(FROM_ISO_TABLE)
+    if '&#' not in text:
+        return text
+    return ENTITY_PATTERN.sub(entity_to_letter, text)
+
+
+def translate_to_iso_codes(text: str) -> str:
+    return text.translate(TO_ISO_TABLE)
+
+
+def encode(text: str, errors: str = 'strict') -> tuple:
+    return translate_to_iso_codes(text).encode('latin-1', errors), len(text)
+
+
+def decode(data, errors: str = 'strict') -> tuple:
+    return translate_from_iso_codes(bytes(data).decode('latin-1', errors)), len(data)
+
+
+def search_codec(name: str):
+    if name != CODEC_NAME:
+        return None
+    return codecs.CodecInfo(name=CODEC_NAME, encode=encode, decode=decode)
+
+
+codecs.register(search_codec)
@@ -0,0 +1,140 @@
+import contextlib
+import hashlib
+import os
+import pickle
+import tempfile
+import typing
+import weakref
+
+import reportlab
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTEncoding, TTFont, TTFontFace
+
+DEFAULT_FONT = 'FreeSans'
+FONT_PATH_ENVIRONMENT_VARIABLE = 'CHARACTER_SHEET_FONT_PATH'  # os.pathsep separated list of directories
+FONT_CACHE_ENVIRONMENT_VARIABLE = 'CHARACTER_SHEET_FONT_CACHE'  # directory for parsed metrics, empty disables it
+
+
+def default_search_path() -> typing.List[str]:
+    search_path = [p for p in os.environ.get(FONT_PATH_ENVIRONMENT_VARIABLE, '').split(os.pathsep) if p]
+    search_path.extend([os.curdir,  # looked up at resolve time, so it follows chdir
+                        os.path.dirname(os.path.abspath(__file__)),
+                        '/usr/share/fonts/truetype/freefont',
+                        '/usr/share/fonts/TTF'])
+    return search_path
+
+
+def default_cache_dir() -> str:
+    if FONT_CACHE_ENVIRONMENT_VARIABLE in os.environ:
+        return os.environ[FONT_CACHE_ENVIRONMENT_VARIABLE]
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'character-sheet', 'fonts')
+
+
+def pdf_scale(units_per_em: int) -> typing.Callable:
+    # the same scale reportlab builds while parsing the head table, it is a local lambda so it cannot be pickled
+    if units_per_em == 1000:
+        return lambda x: x
+    multiplier = 1000 / units_per_em
+    return lambda x: x * multiplier
+
+
+class FontRegistry:
+    """
+    Loads every TrueType font once per process. Font files are looked up in search_path, and the parsed
+    glyph metrics are kept in cache_dir, so a fresh worker process does not have to parse the TTF again
+    """
+
+    def __init__(self, search_path: typing.Optional[typing.Iterable[str]] = None,
+                 cache_dir: typing.Optional[str] = None):
+        self.search_path = list(search_path) if search_path is not None else default_search_path()
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+
+    def resolve(self, filename: str) -> str:
+        if os.path.isabs(filename):
+            if os.path.isfile(filename):
+                return filename
+        else:
+            for directory in self.search_path:
+                path = os.path.join(directory, filename)
+                if os.path.isfile(path):
+                    return os.path.abspath(path)
+        raise FileNotFoundError(f'Font "{filename}" not found in {self.search_path}')
+
+    def register(self, name: str = DEFAULT_FONT, filename: typing.Optional[str] = None) -> TTFont:
+        """
+        Registers the font in reportlab unless it is already registered in this process
+        :param name: name to use in setFont
+        :param filename: TTF file name or absolute path, <name>.ttf if not set
+        :return:
+        """
+        if name in pdfmetrics.getRegisteredFontNames():
+            return pdfmetrics.getFont(name)
+
+        path = self.resolve(filename or f'{name}.ttf')
+        cache_path = self.cache_path(path)
+        font = self.load_cached(name, cache_path) if cache_path else None
+        if font is None:
+            font = TTFont(name, path)
+            if cache_path:
+                self.store_cached(font, cache_path)
+        pdfmetrics.registerFont(font)
+        return font
+
+    def cache_path(self, font_path: str) -> typing.Optional[str]:
+        if not self.cache_dir:
+            return None
+        stat = os.stat(font_path)
+        key = f'{font_path}|{stat.st_mtime_ns}|{stat.st_size}|{reportlab.Version}'
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        font_file_name = os.path.splitext(os.path.basename(font_path))[0]
+        return os.path.join(self.cache_dir, f'{font_file_name}-{digest}.pickle')
+
+    @staticmethod
+    def load_cached(name: str, cache_path: str) -> typing.Optional[TTFont]:
+        """
+        :return: the font made from the cached metrics, None if there is no usable cache file
+        """
+        try:
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            face = TTFontFace.__new__(TTFontFace)
+            face.__dict__.update(cached['face'])
+            face._pdfScale = pdf_scale(face.unitsPerEm)
+            font = TTFont.__new__(TTFont)
+            font.__dict__.update(cached['font'])
+        except FileNotFoundError:
+            return None
+        except Exception as e:  # unreadable or not what store_cached writes, parsed again and overwritten
+            print(f'Cannot read font cache {cache_path}: {type(e).__name__}: {e}')
+            return None
+        font.fontName = name
+        font.face = face
+        font.encoding = TTEncoding()
+        font.state = weakref.WeakKeyDictionary()
+        return font
+
+    @staticmethod
+    def store_cached(font: TTFont, cache_path: str):
+        """
+        Writes the parsed metrics of the font to cache_path. The cache only saves time, so any failure is
+        reported and the font is used anyway
+        """
+        temp_path = None
+        try:
+            # per-document subset state and the encoding are rebuilt on load, only the parsed metrics are stored
+            cached = {'font': {k: v for k, v in vars(font).items() if k not in ('face', 'state', 'encoding')},
+                      'face': {k: v for k, v in vars(font.face).items() if k != '_pdfScale'}}
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # written to a temporary file first, so a concurrently starting worker never reads half a file
+            file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+            with os.fdopen(file_descriptor, 'wb') as f:
+                pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+        except Exception as e:
+            print(f'Cannot write font cache {cache_path}: {type(e).__name__}: {e}')
+            if temp_path is not None:
+                with contextlib.suppress(OSError):
+                    os.unlink(temp_path)
+
+font_registry = FontRegistry()
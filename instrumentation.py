@@ -0,0 +1,170 @@
+"""
+Timing of the render pipeline. Every render is split into stages (load, transliterate, fragments, overlay, merge),
+each reported to the registered listeners with its wall and CPU time, the bytes it produced and what else it knows.
+With no listeners the stages cost next to nothing.
+
+    timings = []
+    with render_hooks.listening(timings.append):
+        parser.render_character_file('Leila.xml', 'Leila.pdf')
+
+One render can also be profiled with cProfile, the stats are written to a file readable by pstats:
+
+    render_hooks.profile_next_render('render.pstats')
+
+or with CHARACTER_SHEET_PROFILE=render.pstats for the first render of every process: the main one writes
+render.pstats, and each worker of a batch or the server writes its own first render to render.<pid>.pstats,
+so workers do not overwrite each other's stats
+"""
+import contextlib
+import contextvars
+import cProfile
+import multiprocessing
+import os
+import time
+import typing
+from collections import namedtuple
+
+PROFILE_ENVIRONMENT_VARIABLE = 'CHARACTER_SHEET_PROFILE'  # pstats file for the first render of the process
+RENDER_STAGE = 'render'  # the whole render, reported after all of its stages
+
+# render: name of the render the stage belongs to (usually the result file). wall and cpu: seconds, cpu is the time
+# of the rendering thread. bytes: size of what the stage read or produced, None if it does not apply
+StageTiming = namedtuple('StageTiming', ('render', 'stage', 'wall', 'cpu', 'bytes', 'details'))
+
+current_render = contextvars.ContextVar('current_render', default=None)
+
+
+def process_profile_path(path: str) -> str:
+    """
+    Path for the profile of this process: render.pstats as is in the main process, render.<pid>.pstats in
+    worker processes
+    """
+    if multiprocessing.parent_process() is None:
+        return path
+    base, extension = os.path.splitext(path)
+    return f'{base}.{os.getpid()}{extension}'
+
+
+class Stage:
+    """
+    What the timed code tells about its work
+    """
+    __slots__ = ('bytes', 'details')
+
+    def __init__(self):
+        self.bytes = None  # type: typing.Optional[int]
+        self.details = {}  # type: typing.Dict[str, typing.Any]
+
+
+class CountingSink:
+    """
+    Passes writes on to sink and counts the bytes
+    """
+    __slots__ = ('sink', 'bytes')
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.bytes = 0
+
+    def write(self, data) -> int:
+        self.bytes += len(data)
+        return self.sink.write(data)
+
+
+class RenderInstrumentation:
+    def __init__(self):
+        self.listeners = []  # type: typing.List[typing.Callable[[StageTiming], typing.Any]]
+        self.profile_path = None  # type: typing.Optional[str]  # set by profile_next_render
+        # processes whose first render was already profiled for CHARACTER_SHEET_PROFILE, checked by pid because
+        # forked workers inherit this object from the parent
+        self.environment_profiled_pids = set()  # type: typing.Set[int]
+
+    def add_listener(self, listener: typing.Callable[[StageTiming], typing.Any]):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: typing.Callable[[StageTiming], typing.Any]):
+        self.listeners.remove(listener)
+
+    @contextlib.contextmanager
+    def listening(self, listener: typing.Callable[[StageTiming], typing.Any]):
+        self.add_listener(listener)
+        try:
+            yield listener
+        finally:
+            self.remove_listener(listener)
+
+    def profile_next_render(self, path: str):
+        """
+        Runs the next render under cProfile and writes its stats to path
+        """
+        self.profile_path = path
+
+    def environment_profile_path(self) -> typing.Optional[str]:
+        """
+        CHARACTER_SHEET_PROFILE for the first render of this process, None afterwards
+        """
+        path = os.environ.get(PROFILE_ENVIRONMENT_VARIABLE)
+        if not path or os.getpid() in self.environment_profiled_pids:
+            return None
+        self.environment_profiled_pids.add(os.getpid())
+        return process_profile_path(path)
+
+    @contextlib.contextmanager
+    def render(self, name: str):
+        """
+        Marks one render: its stages are reported with its name. Nested renders (render_character calls
+        render_character_to) belong to the outermost one
+        """
+        if current_render.get() is not None:
+            yield
+            return
+        token = current_render.set(name)
+        profile_path, self.profile_path = self.profile_path or self.environment_profile_path(), None
+        profiler = cProfile.Profile() if profile_path else None
+        try:
+            with self.stage(RENDER_STAGE):
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    yield
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            current_render.reset(token)
+            if profiler is not None:
+                profiler.dump_stats(profile_path)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> typing.Iterator[Stage]:
+        """
+        Times the code inside and reports it to the listeners, even if it fails
+        :return: Stage to put the byte count and details into
+        """
+        stage = Stage()
+        if not self.listeners:
+            yield stage
+            return
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield stage
+        finally:
+            timing = StageTiming(render=current_render.get(), stage=name, wall=time.perf_counter() - wall,
+                                 cpu=time.thread_time() - cpu, bytes=stage.bytes, details=stage.details)
+            for listener in list(self.listeners):
+                listener(timing)
+
+
+def print_stage(timing: StageTiming):
+    """
+    Listener printing every stage on one line
+    """
+    line = f'{timing.render}: {timing.stage} {timing.wall * 1000:.1f} ms, CPU {timing.cpu * 1000:.1f} ms'
+    if timing.bytes is not None:
+        line += f', {timing.bytes} bytes'
+    for name, value in timing.details.items():
+        line += f', {name}: {value}'
+    print(line)
+
+
+render_hooks = RenderInstrumentation()
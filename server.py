@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import os
+import sys
+import typing
+import xml.etree.ElementTree as ElementTree
+
+from aiohttp import web
+
+import batch
+import parser
+from CharacterSheet import CharacterSheet
+from character_model import character_element
+
+DEFAULT_MAX_REQUEST_SIZE = 4 * 1024 * 1024  # a Fantasy Grounds export is usually well under 1 MB
+DEFAULT_QUEUE_SIZE = 16  # requests allowed to wait for a free worker, on top of the ones being rendered
+RENDER_ERRORS = (ElementTree.ParseError, ValueError, TypeError)  # bad input, answered with 400
+
+
+def render_xml(data: bytes, skip_name: bool = False) -> bytes:
+    """
+    Runs in a worker process: parses an uploaded Fantasy Grounds export and renders it
+    """
+    character = parser.Character.from_element(character_element(ElementTree.fromstring(data)))
+    return parser.render_character_bytes(character, template=batch.worker_template_filename, skip_name=skip_name)
+
+
+def render_fields(values: typing.Dict[str, typing.Any],
+                  override_font_sizes: typing.Optional[typing.Dict[str, int]] = None,
+                  abilities_modifiers_bigger: bool = True) -> bytes:
+    """
+    Runs in a worker process: fills a CharacterSheet from a field name -> value map
+    """
+    sheet = CharacterSheet(result_file_name='', abilities_modifiers_bigger=abilities_modifiers_bigger,
+                           template_file_name=batch.worker_template_filename)
+    sheet.set_fields(values, override_font_sizes)
+    return sheet.render_bytes()
+
+
+class WorkerPool:
+    """
+    The process pool rendering sheets, with every worker started in advance. A pool whose worker died (killed
+    by the OOM killer, crashed) refuses all work, so it is replaced by a new one in the background
+    """
+
+    def __init__(self, jobs: int, template_filename: str):
+        self.jobs = jobs
+        self.template_filename = template_filename
+        self.executor = None  # type: typing.Optional[concurrent.futures.ProcessPoolExecutor]  # None while restarting
+        self.lock = asyncio.Lock()  # one pool is built at a time
+        self.restarting = None  # type: typing.Optional[asyncio.Task]
+
+    async def new_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs, initializer=batch.init_worker,
+                                                          initargs=(self.template_filename,))
+        # start every worker now, so the first requests do not pay for loading the template and the font
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(executor, os.getpid) for _ in range(self.jobs)])
+        return executor
+
+    async def start(self):
+        async with self.lock:
+            self.executor = await self.new_executor()
+
+    def restart(self, broken: typing.Optional[concurrent.futures.ProcessPoolExecutor]):
+        """
+        Replaces the broken executor, unless that is already done or being done
+        """
+        if self.executor is not broken or (self.restarting is not None and not self.restarting.done()):
+            return
+        self.executor = None
+        self.restarting = asyncio.ensure_future(self.replace(broken))
+
+    async def replace(self, broken: typing.Optional[concurrent.futures.ProcessPoolExecutor]):
+        async with self.lock:
+            if broken is not None:
+                broken.shutdown(wait=False, cancel_futures=True)
+            try:
+                self.executor = await self.new_executor()
+            except Exception as e:  # tried again by the next request
+                print(f'Cannot restart the worker pool: {type(e).__name__}: {e}')
+                return
+            print('Worker pool restarted')
+
+    async def shutdown(self):
+        if self.restarting is not None:
+            await self.restarting
+        if self.executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+
+POOL_KEY = web.AppKey('pool', WorkerPool)
+
+
+class RenderLimiter:
+    """
+    Counts renders that are running or waiting for a worker. Once capacity is reached new requests are
+    refused at once instead of piling up in the executor queue
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.pending = 0
+
+    def try_acquire(self) -> bool:
+        if self.pending >= self.capacity:
+            return False
+        self.pending += 1
+        return True
+
+    def release(self):
+        self.pending -= 1
+
+
+LIMITER_KEY = web.AppKey('limiter', RenderLimiter)
+
+
+async def run_in_pool(request: web.Request, function, *args) -> web.Response:
+    limiter = request.app[LIMITER_KEY]
+    pool = request.app[POOL_KEY]
+    if pool.executor is None:
+        pool.restart(None)
+        raise web.HTTPServiceUnavailable(text='Workers are restarting, try again later', headers={'Retry-After': '1'})
+    if not limiter.try_acquire():
+        raise web.HTTPServiceUnavailable(text='All workers are busy, try again later', headers={'Retry-After': '1'})
+    executor = pool.executor
+    try:
+        pdf = await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+    except BrokenProcessPool:
+        pool.restart(executor)
+        raise web.HTTPServiceUnavailable(text='A worker died, try again later', headers={'Retry-After': '1'})
+    except RENDER_ERRORS as e:
+        raise web.HTTPBadRequest(text=f'{type(e).__name__}: {e}')
+    finally:
+        limiter.release()
+    return web.Response(body=pdf, content_type='application/pdf')
+
+
+def query_flag(request: web.Request, name: str) -> bool:
+    return request.query.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+async def read_upload(request: web.Request) -> bytes:
+    """
+    The XML either as the raw request body or as the first file of a multipart form
+    """
+    if request.content_type != 'multipart/form-data':
+        return await request.read()
+    reader = await request.multipart()
+    async for part in reader:
+        if part.filename is not None:
+            return await part.read()
+    raise web.HTTPBadRequest(text='No file in the form')
+
+
+async def render_xml_handler(request: web.Request) -> web.Response:
+    data = await read_upload(request)
+    if not data:
+        raise web.HTTPBadRequest(text='Empty upload')
+    return await run_in_pool(request, render_xml, data, query_flag(request, 'skip_name'))
+
+
+async def render_fields_handler(request: web.Request) -> web.Response:
+    """
+    Body: {"fields": {"Имя персонажа": "...", ...}, "font_sizes": {"Раса": 12}, "abilities_modifiers_bigger": true}
+    """
+    try:
+        document = await request.json()
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=f'Invalid JSON: {e}')
+    if not isinstance(document, dict) or not isinstance(document.get('fields'), dict):
+        raise web.HTTPBadRequest(text='"fields" must be an object')
+    font_sizes = document.get('font_sizes')
+    if font_sizes is not None and (not isinstance(font_sizes, dict) or not all(
+            isinstance(size, (int, float)) and not isinstance(size, bool) for size in font_sizes.values())):
+        raise web.HTTPBadRequest(text='"font_sizes" must be an object of field name -> number')
+    return await run_in_pool(request, render_fields, document['fields'], font_sizes,
+                             document.get('abilities_modifiers_bigger', True) is not False)
+
+
+async def health_handler(request: web.Request) -> web.Response:
+    limiter = request.app[LIMITER_KEY]
+    return web.json_response({'pending': limiter.pending, 'capacity': limiter.capacity})
+
+
+def create_app(*,
+               template_filename: str = 'character_sheet_light.pdf',
+               jobs: typing.Optional[int] = None,
+               queue_size: int = DEFAULT_QUEUE_SIZE,
+               max_request_size: int = DEFAULT_MAX_REQUEST_SIZE) -> web.Application:
+    """
+    Builds the rendering service
+    :param template_filename: template PDF, preloaded with the font by every worker
+    :param jobs: number of worker processes, os.cpu_count() if not set
+    :param queue_size: how many requests may wait for a worker before the service answers 503
+    :param max_request_size: bigger uploads are refused with 413
+    :return:
+    """
+    jobs = jobs or os.cpu_count() or 1
+    app = web.Application(client_max_size=max_request_size)
+    app[LIMITER_KEY] = RenderLimiter(jobs + queue_size)
+
+    async def worker_pool(app: web.Application):
+        pool = WorkerPool(jobs, template_filename)
+        await pool.start()
+        app[POOL_KEY] = pool
+        yield
+        # aiohttp has already stopped accepting requests and waited for the running ones
+        await pool.shutdown()
+
+    app.cleanup_ctx.append(worker_pool)
+    app.router.add_post('/render/xml', render_xml_handler)
+    app.router.add_post('/render/fields', render_fields_handler)
+    app.router.add_get('/health', health_handler)
+    return app
+
+
+def main(argv=None) -> int:
+    argument_parser = argparse.ArgumentParser(description='HTTP service rendering character sheets')
+    argument_parser.add_argument('--host', default='127.0.0.1')
+    argument_parser.add_argument('--port', type=int, default=8080)
+    argument_parser.add_argument('-t', '--template', default='character_sheet_light.pdf', help='template PDF')
+    argument_parser.add_argument('-j', '--jobs', type=int, default=None,
+                                 help='number of worker processes, CPU count by default')
+    argument_parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                                 help='requests waiting for a worker before answering 503')
+    argument_parser.add_argument('--max-request-size', type=int, default=DEFAULT_MAX_REQUEST_SIZE,
+                                 help='largest accepted request body in bytes')
+    argument_parser.add_argument('--shutdown-timeout', type=float, default=60,
+                                 help='seconds to let running renders finish on shutdown')
+    arguments = argument_parser.parse_args(argv)
+
+    app = create_app(template_filename=arguments.template,
+                     jobs=arguments.jobs,
+                     queue_size=arguments.queue_size,
+                     max_request_size=arguments.max_request_size)
+    web.run_app(app, host=arguments.host, port=arguments.port, shutdown_timeout=arguments.shutdown_timeout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
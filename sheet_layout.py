@@ -0,0 +1,114 @@
+import json
+import os
+import typing
+from collections import namedtuple
+
+LAYOUT_FORMAT_VERSION = 1
+LAYOUTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts')
+DEFAULT_LAYOUT = 'character_sheet_light'
+
+Slot = namedtuple('Slot', ('x', 'y', 'size', 'limit', 'plus_minus', 'centered'))
+SLOT_REQUIRED_KEYS = ('x', 'y', 'size', 'limit')
+SLOT_OPTIONAL_KEYS = ('plus_minus', 'dont_center')
+
+
+class Layout:
+    """
+    Where every value goes on one template: slot name -> coordinates, font size, length limit and alignment.
+    Slots are stored once in a tuple and looked up through a name index
+    """
+    __slots__ = ('name', 'version', 'template', 'slot_index', 'slots')
+
+    def __init__(self, name: str, version: int, template: str, slots: typing.Dict[str, Slot]):
+        self.name = name
+        self.version = version
+        self.template = template
+        self.slot_index = {slot_name: index for index, slot_name in enumerate(slots)}
+        self.slots = tuple(slots.values())
+
+    def __getitem__(self, slot_name: str) -> Slot:
+        return self.slots[self.slot_index[slot_name]]
+
+    def __contains__(self, slot_name: str) -> bool:
+        return slot_name in self.slot_index
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __repr__(self):
+        return f'Layout({self.name!r}, version={self.version}, template={self.template!r}, slots={len(self)})'
+
+
+def parse_slot(slot_name: str, description: dict) -> Slot:
+    if not isinstance(description, dict):
+        raise ValueError(f'Slot "{slot_name}" must be an object, got {description!r}')
+    missing = [key for key in SLOT_REQUIRED_KEYS if key not in description]
+    if missing:
+        raise ValueError(f'Slot "{slot_name}" misses {missing}')
+    unknown = [key for key in description if key not in SLOT_REQUIRED_KEYS + SLOT_OPTIONAL_KEYS]
+    if unknown:
+        raise ValueError(f'Slot "{slot_name}" has unknown keys {unknown}')
+    for key in SLOT_REQUIRED_KEYS:
+        if not isinstance(description[key], (int, float)) or isinstance(description[key], bool):
+            raise ValueError(f'Slot "{slot_name}": "{key}" must be a number, got {description[key]!r}')
+    if description['limit'] <= 0 or description['size'] <= 0:
+        raise ValueError(f'Slot "{slot_name}": "size" and "limit" must be positive')
+    return Slot(x=description['x'],
+                y=description['y'],
+                size=description['size'],
+                limit=description['limit'],
+                plus_minus=description.get('plus_minus') is True,
+                centered=description.get('dont_center') is not True)
+
+
+def parse_layout(name: str, document: dict) -> Layout:
+    """
+    Validates a layout document, see layouts/character_sheet_light.json for the format
+    """
+    if document.get('version') != LAYOUT_FORMAT_VERSION:
+        raise ValueError(f'Layout "{name}" has version {document.get("version")!r}, '
+                         f'only version {LAYOUT_FORMAT_VERSION} is supported')
+    if not isinstance(document.get('template'), str):
+        raise ValueError(f'Layout "{name}" must name its template PDF')
+    if not isinstance(document.get('slots'), dict) or not document['slots']:
+        raise ValueError(f'Layout "{name}" has no slots')
+    slots = {slot_name: parse_slot(slot_name, description) for slot_name, description in document['slots'].items()}
+    return Layout(name=name, version=document['version'], template=document['template'], slots=slots)
+
+
+class LayoutRegistry:
+    """
+    Loads and validates every layout once, on first use. A layout is a <name>.json file in directory
+    """
+
+    def __init__(self, directory: str = LAYOUTS_DIRECTORY):
+        self.directory = directory
+        self._layouts = {}  # type: typing.Dict[str, Layout]
+
+    def get(self, name: str = DEFAULT_LAYOUT) -> Layout:
+        try:
+            return self._layouts[name]
+        except KeyError:
+            pass
+        path = os.path.join(self.directory, f'{name}.json')
+        with open(path, encoding='utf-8') as f:
+            layout = parse_layout(name, json.load(f))
+        self._layouts[name] = layout
+        return layout
+
+    def register(self, layout: Layout):
+        self._layouts[layout.name] = layout
+
+    def for_template(self, template) -> Layout:
+        """
+        Layout named after the template file (character_sheet_light.pdf -> character_sheet_light), the default
+        layout for file-like templates and templates without their own layout
+        """
+        if isinstance(template, str):
+            name = os.path.splitext(os.path.basename(template))[0]
+            if name in self._layouts or os.path.isfile(os.path.join(self.directory, f'{name}.json')):
+                return self.get(name)
+        return self.get(DEFAULT_LAYOUT)
+
+
+layout_registry = LayoutRegistry()
@@ -0,0 +1,110 @@
+import json
+import os
+import re
+import sqlite3
+import time
+import typing
+
+from spells import Spell, SpellAttribute
+
+SPELL_CACHE_ENVIRONMENT_VARIABLE = 'CHARACTER_SHEET_SPELL_CACHE'  # path of the SQLite file, empty disables it
+DEFAULT_TTL = 30 * 24 * 60 * 60  # seconds, spell texts on the site practically never change
+
+
+def default_cache_path() -> str:
+    if SPELL_CACHE_ENVIRONMENT_VARIABLE in os.environ:
+        return os.environ[SPELL_CACHE_ENVIRONMENT_VARIABLE]
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'character-sheet', 'spells.sqlite')
+
+
+def normalize_name(name: str) -> str:
+    """
+    'Hellish  Rebuke ' and 'hellish rebuke' are the same spell
+    """
+    return re.sub(r'\s+', ' ', name).strip().lower()
+
+
+class SpellCache:
+    """
+    Parsed spells stored in SQLite, keyed by normalized English name. Entries older than ttl are treated as missing,
+    unless the cache is offline: then every stored entry is served and nothing is fetched from the site.
+    The database is opened on first use
+    """
+
+    def __init__(self, path: typing.Optional[str] = None, ttl: float = DEFAULT_TTL, offline: bool = False):
+        self.path = path if path is not None else default_cache_path()
+        self.ttl = ttl
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._connection = None  # type: typing.Optional[sqlite3.Connection]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.path)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS spells '
+                                     '(name TEXT PRIMARY KEY, fetched_at REAL NOT NULL, attributes TEXT NOT NULL)')
+        return self._connection
+
+    def get(self, name: str) -> typing.Optional[Spell]:
+        """
+        :return: the cached Spell, or None if it is not cached or expired
+        """
+        if not self.enabled:
+            return None
+        row = self.connection().execute('SELECT fetched_at, attributes FROM spells WHERE name = ?',
+                                        (normalize_name(name),)).fetchone()
+        if row is None or (not self.offline and time.time() - row[0] > self.ttl):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return spell_from_json(row[1])
+
+    def put(self, name: str, spell: Spell):
+        if not self.enabled:
+            return
+        with self.connection():
+            self.connection().execute('INSERT OR REPLACE INTO spells (name, fetched_at, attributes) VALUES (?, ?, ?)',
+                                      (normalize_name(name), time.time(), spell_to_json(spell)))
+
+    def spells(self) -> typing.Iterator[Spell]:
+        """
+        Every stored spell, expired ones included
+        """
+        if not self.enabled:
+            return
+        for (attributes,) in self.connection().execute('SELECT attributes FROM spells ORDER BY name'):
+            yield spell_from_json(attributes)
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self.connection():
+            self.connection().execute('DELETE FROM spells')
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def stats(self) -> typing.Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def spell_to_json(spell: Spell) -> str:
+    # a Spell iterates over its SpellAttribute tuples, values are str, int or lists of str
+    return json.dumps([list(attribute) for attribute in spell], ensure_ascii=False)
+
+
+def spell_from_json(data: str) -> Spell:
+    return Spell(*[SpellAttribute(*attribute) for attribute in json.loads(data)])
+
+
+spell_cache = SpellCache()
@@ -0,0 +1,307 @@
+import argparse
+import array
+from collections import namedtuple
+import re
+import sys
+import typing
+
+from spell_cache import SpellCache, normalize_name
+from spell_index import SpellIndex
+from spells import Spell
+
+# dungeon.su names -> English ones, queries accept both
+CLASS_NAMES = {'бард': 'bard',
+               'варвар': 'barbarian',
+               'воин': 'fighter',
+               'волшебник': 'wizard',
+               'друид': 'druid',
+               'жрец': 'cleric',
+               'изобретатель': 'artificer',
+               'колдун': 'warlock',
+               'монах': 'monk',
+               'паладин': 'paladin',
+               'плут': 'rogue',
+               'следопыт': 'ranger',
+               'чародей': 'sorcerer',
+               }
+SCHOOL_NAMES = {'воплощение': 'evocation',
+                'вызов': 'conjuration',
+                'иллюзия': 'illusion',
+                'некромантия': 'necromancy',
+                'ограждение': 'abjuration',
+                'очарование': 'enchantment',
+                'преобразование': 'transmutation',
+                'прорицание': 'divination',
+                }
+
+# flags column bits
+VERBAL = 1
+SOMATIC = 2
+MATERIAL = 4
+RITUAL = 8
+CONCENTRATION = 16
+COMPONENT_LETTERS = {'в': VERBAL, 'с': SOMATIC, 'м': MATERIAL, 'v': VERBAL, 's': SOMATIC, 'm': MATERIAL}
+
+UNKNOWN_LEVEL = -1  # the parser default when the page has no level
+CANTRIP = 0
+
+SpellRecord = namedtuple('SpellRecord', ('name', 'ru_name', 'level', 'school', 'classes', 'components', 'material',
+                                         'ritual', 'concentration'))
+
+
+def english_name(name: str, translations: typing.Dict[str, str]) -> str:
+    name = normalize_name(name).replace('ё', 'е')
+    return translations.get(name, name)
+
+
+def parse_level(text) -> int:
+    if isinstance(text, int):
+        return text
+    if 'заговор' in str(text).lower():
+        return CANTRIP
+    match = re.search(r'\d+', str(text))
+    return int(match.group()) if match else UNKNOWN_LEVEL
+
+
+def parse_components(text) -> typing.Tuple[int, str]:
+    """
+    'В, С, М (крошечный шарик из гуано)' -> (VERBAL | SOMATIC | MATERIAL, 'крошечный шарик из гуано')
+    """
+    text = ', '.join(text) if isinstance(text, list) else str(text)
+    letters, _, material = text.partition('(')
+    flags = 0
+    for letter in letters.split(','):
+        flags |= COMPONENT_LETTERS.get(letter.strip().lower()[:1], 0)
+    return flags, material.rpartition(')')[0].strip()
+
+
+def parse_classes(text) -> typing.Tuple[str, ...]:
+    names = text if isinstance(text, list) else str(text).split(',')
+    return tuple(english_name(name, CLASS_NAMES) for name in names if name.strip())
+
+
+def spell_record(spell: Spell) -> SpellRecord:
+    """
+    Typed fields of a parsed spell: the site gives every attribute as text
+    """
+    components, material = parse_components(spell.components.ru_value)
+    texts = f'{spell.level.ru_value} {spell.school.ru_value} {spell.cast_time.ru_value}'.lower()
+    school = str(spell.school.ru_value).split('(')[0]
+    return SpellRecord(name=spell.name.en_value,
+                       ru_name=spell.name.ru_value,
+                       level=parse_level(spell.level.ru_value),
+                       school=english_name(school, SCHOOL_NAMES) if school not in ('нет', 'na') else '',
+                       classes=parse_classes(spell.classes.ru_value),
+                       components=components,
+                       material=material,
+                       ritual='ритуал' in texts,
+                       concentration=str(spell.duration.ru_value).lower().startswith('концентрация'))
+
+
+def bits(mask: int) -> typing.Iterator[int]:
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+class SpellCatalogue:
+    """
+    Spells as typed columns, one row per spell, with secondary indexes by level, school, class and flag.
+    Every index value is a bitset of rows (a Python int), so a query is a few ORs and ANDs
+    and takes microseconds for the whole spell list
+    """
+
+    def __init__(self, spells: typing.Iterable[Spell] = ()):
+        self.spells = []  # type: typing.List[Spell]
+        self.rows = {}  # type: typing.Dict[str, int]  # normalized English name -> row
+        self.names = []  # type: typing.List[str]
+        self.ru_names = []  # type: typing.List[str]
+        self.levels = array.array('b')
+        self.schools = array.array('I')  # number in school_names
+        self.classes = []  # type: typing.List[int]  # bit mask of numbers in class_names, as many bits as needed
+        self.flags = array.array('B')  # VERBAL | SOMATIC | MATERIAL | RITUAL | CONCENTRATION
+        self.materials = {}  # type: typing.Dict[int, str]  # row -> material component, only rows that have one
+        self.school_names = ['']  # number -> name, 0 is unknown
+        self.class_names = []  # type: typing.List[str]
+        self.school_numbers = {'': 0}  # type: typing.Dict[str, int]  # name -> number in school_names
+        self.class_numbers = {}  # type: typing.Dict[str, int]  # name -> number in class_names
+        self.by_level = {}  # type: typing.Dict[int, int]
+        self.by_school = {}  # type: typing.Dict[int, int]
+        self.by_class = {}  # type: typing.Dict[int, int]
+        self.by_flag = {flag: 0 for flag in (VERBAL, SOMATIC, MATERIAL, RITUAL, CONCENTRATION)}
+        for spell in spells:
+            self.add(spell)
+
+    def __len__(self):
+        return len(self.spells)
+
+    @staticmethod
+    def number(names: typing.List[str], numbers: typing.Dict[str, int], name: str) -> int:
+        if name not in numbers:
+            numbers[name] = len(names)
+            names.append(name)
+        return numbers[name]
+
+    def add(self, spell: Spell):
+        """
+        Adds the spell, replacing a stored one with the same English name
+        """
+        record = spell_record(spell)
+        school = self.number(self.school_names, self.school_numbers, record.school)
+        classes = 0
+        for class_name in record.classes:
+            classes |= 1 << self.number(self.class_names, self.class_numbers, class_name)
+        flags = record.components | (RITUAL if record.ritual else 0) | (CONCENTRATION if record.concentration else 0)
+        key = normalize_name(record.name or record.ru_name)
+
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.spells)
+            self.rows[key] = row
+            self.spells.append(spell)
+            self.names.append(record.name)
+            self.ru_names.append(record.ru_name)
+            self.levels.append(record.level)
+            self.schools.append(school)
+            self.classes.append(classes)
+            self.flags.append(flags)
+        else:
+            self._unindex(row)
+            self.spells[row] = spell
+            self.names[row] = record.name
+            self.ru_names[row] = record.ru_name
+            self.levels[row] = record.level
+            self.schools[row] = school
+            self.classes[row] = classes
+            self.flags[row] = flags
+            self.materials.pop(row, None)
+        if record.material:
+            self.materials[row] = record.material
+        self._index(row)
+
+    def _index(self, row: int):
+        bit = 1 << row
+        self.by_level[self.levels[row]] = self.by_level.get(self.levels[row], 0) | bit
+        self.by_school[self.schools[row]] = self.by_school.get(self.schools[row], 0) | bit
+        for number in bits(self.classes[row]):
+            self.by_class[number] = self.by_class.get(number, 0) | bit
+        for flag in bits(self.flags[row]):
+            self.by_flag[1 << flag] |= bit
+
+    def _unindex(self, row: int):
+        bit = ~(1 << row)
+        self.by_level[self.levels[row]] &= bit
+        self.by_school[self.schools[row]] &= bit
+        for number in bits(self.classes[row]):
+            self.by_class[number] &= bit
+        for flag in bits(self.flags[row]):
+            self.by_flag[1 << flag] &= bit
+
+    def record(self, row: int) -> SpellRecord:
+        flags = self.flags[row]
+        return SpellRecord(name=self.names[row],
+                           ru_name=self.ru_names[row],
+                           level=self.levels[row],
+                           school=self.school_names[self.schools[row]],
+                           classes=tuple(self.class_names[number] for number in bits(self.classes[row])),
+                           components=flags & (VERBAL | SOMATIC | MATERIAL),
+                           material=self.materials.get(row, ''),
+                           ritual=bool(flags & RITUAL),
+                           concentration=bool(flags & CONCENTRATION))
+
+    def _any_of(self, names, translations: typing.Dict[str, str], numbers: typing.Dict[str, int],
+                index: typing.Dict[int, int]) -> int:
+        mask = 0
+        for name in [names] if isinstance(names, str) else names:
+            name = english_name(name, translations)
+            if name in numbers:
+                mask |= index.get(numbers[name], 0)
+            elif name not in translations.values():
+                raise ValueError(f'Unknown name "{name}", expected one of {sorted(translations.values())}')
+        return mask
+
+    def select(self, *,
+               classes: typing.Union[str, typing.Iterable[str], None] = None,
+               school: typing.Union[str, typing.Iterable[str], None] = None,
+               level: typing.Optional[int] = None,
+               min_level: typing.Optional[int] = None,
+               max_level: typing.Optional[int] = None,
+               components: int = 0,
+               ritual: typing.Optional[bool] = None,
+               concentration: typing.Optional[bool] = None) -> typing.List[int]:
+        """
+        Rows of the spells matching every given condition, by level and name
+        :param classes: class name or names, Russian or English, a spell of any of them matches
+        :param school: school name or names, Russian or English
+        :param level: exact level, 0 for cantrips
+        :param components: VERBAL, SOMATIC, MATERIAL or their combination the spell must need
+        :param ritual: True for rituals only, False for non rituals only
+        :param concentration: the same for concentration
+        """
+        mask = (1 << len(self.spells)) - 1
+        if classes is not None:
+            mask &= self._any_of(classes, CLASS_NAMES, self.class_numbers, self.by_class)
+        if school is not None:
+            mask &= self._any_of(school, SCHOOL_NAMES, self.school_numbers, self.by_school)
+        if level is not None:
+            min_level = max_level = level
+        if min_level is not None or max_level is not None:
+            low = CANTRIP if min_level is None else min_level
+            high = max(self.by_level, default=CANTRIP) if max_level is None else max_level
+            by_level = 0
+            for spell_level, rows in self.by_level.items():
+                if low <= spell_level <= high:
+                    by_level |= rows
+            mask &= by_level
+        for flag in bits(components):
+            mask &= self.by_flag[1 << flag]
+        for flag, wanted in ((RITUAL, ritual), (CONCENTRATION, concentration)):
+            if wanted is not None:
+                mask &= self.by_flag[flag] if wanted else ~self.by_flag[flag]
+        return sorted(bits(mask), key=lambda row: (self.levels[row], self.names[row]))
+
+    def query(self, **conditions) -> typing.List[SpellRecord]:
+        """
+        Typed records of the matching spells, see select for the conditions
+        """
+        return [self.record(row) for row in self.select(**conditions)]
+
+    def query_spells(self, **conditions) -> typing.List[Spell]:
+        return [self.spells[row] for row in self.select(**conditions)]
+
+
+def main(argv=None) -> int:
+    argument_parser = argparse.ArgumentParser(description='Find spells of the local spell index by class, level '
+                                                          'and school')
+    argument_parser.add_argument('-i', '--index', default=None, help='index file, see spell_index.default_index_path()')
+    argument_parser.add_argument('--cache', action='store_true', help='also use every spell of the spell cache')
+    argument_parser.add_argument('-c', '--class', dest='classes', action='append', help='class, may be repeated')
+    argument_parser.add_argument('-s', '--school', action='append', help='school, may be repeated')
+    argument_parser.add_argument('-l', '--level', type=int, default=None)
+    argument_parser.add_argument('--min-level', type=int, default=None)
+    argument_parser.add_argument('--max-level', type=int, default=None)
+    argument_parser.add_argument('--ritual', action='store_true', default=None, help='rituals only')
+    argument_parser.add_argument('--concentration', action='store_true', default=None,
+                                 help='concentration spells only')
+    arguments = argument_parser.parse_args(argv)
+
+    catalogue = SpellCatalogue(SpellIndex.load(arguments.index).spells)
+    if arguments.cache:
+        for spell in SpellCache().spells():
+            catalogue.add(spell)
+    try:
+        records = catalogue.query(classes=arguments.classes, school=arguments.school, level=arguments.level,
+                                  min_level=arguments.min_level, max_level=arguments.max_level,
+                                  ritual=arguments.ritual, concentration=arguments.concentration)
+    except ValueError as e:
+        print(e)
+        return 2
+    for record in records:
+        print(f'{record.level:>2} {record.name} ({record.ru_name}), {record.school}, {", ".join(record.classes)}')
+    print(f'{len(records)} of {len(catalogue)} spells')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
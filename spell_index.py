@@ -0,0 +1,255 @@
+import argparse
+import bisect
+import collections
+import glob
+import os
+import re
+import sys
+import typing
+
+from spell_cache import SpellCache, normalize_name, spell_from_json, spell_to_json
+from spells import Spell
+
+SPELL_INDEX_ENVIRONMENT_VARIABLE = 'CHARACTER_SHEET_SPELL_INDEX'  # path of the saved index
+WORD_PATTERN = re.compile(r'\w+')
+DEFAULT_FUZZY_CUTOFF = 0.5  # Dice coefficient of name trigrams, 1 is the same name
+
+
+def default_index_path() -> str:
+    if SPELL_INDEX_ENVIRONMENT_VARIABLE in os.environ:
+        return os.environ[SPELL_INDEX_ENVIRONMENT_VARIABLE]
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'character-sheet', 'spell_index.jsonl')
+
+
+def index_key(text: str) -> str:
+    return normalize_name(str(text)).replace('ё', 'е')
+
+
+def trigrams(key: str) -> typing.Set[str]:
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def name_keys(spell: Spell) -> typing.List[str]:
+    """
+    Index keys of the English and the Russian name, the English one first
+    """
+    return [index_key(value) for value in (spell.name.en_value, spell.name.ru_value) if value]
+
+
+def spell_words(spell: Spell) -> typing.Set[str]:
+    words = set()
+    for text in (spell.name.en_value, spell.name.ru_value, spell.description.ru_value, spell.higher_levels.ru_value):
+        words.update(WORD_PATTERN.findall(index_key(text)))
+    return words
+
+
+class SpellIndex:
+    """
+    Local index of spells: exact, prefix and fuzzy lookup by Russian or English name, and word search over
+    names and descriptions. Everything is kept in dictionaries and a sorted name list, so a lookup takes
+    microseconds and needs no network
+    """
+
+    def __init__(self, spells: typing.Iterable[Spell] = ()):
+        self.spells = []  # type: typing.List[Spell]
+        self.names = {}  # type: typing.Dict[str, int]  # index_key of a Russian or English name -> spell number
+        self.name_trigrams = collections.defaultdict(set)  # type: typing.Dict[str, typing.Set[str]]
+        self.words = collections.defaultdict(set)  # type: typing.Dict[str, typing.Set[int]]
+        self._sorted_names = None  # type: typing.Optional[typing.List[str]]  # built on first prefix lookup
+        self.add_many(spells)
+
+    def __len__(self):
+        return len(self.spells)
+
+    def add(self, spell: Spell):
+        """
+        Adds the spell, replacing a stored one with the same English name
+        """
+        keys = name_keys(spell)
+        if not keys:
+            return
+        number = self.names.get(keys[0])  # the English name if there is one
+        if number is None:
+            number = len(self.spells)
+            self.spells.append(spell)
+        else:
+            self._unindex(number)
+            self.spells[number] = spell
+        for key in keys:
+            self.names[key] = number
+            for trigram in trigrams(key):
+                self.name_trigrams[trigram].add(key)
+        for word in spell_words(spell):
+            self.words[word].add(number)
+        self._sorted_names = None
+
+    def _unindex(self, number: int):
+        """
+        Removes the names and words of the spell stored under number, so a replaced spell is not found by
+        its old Russian name or description
+        """
+        spell = self.spells[number]
+        for key in name_keys(spell):
+            if self.names.get(key) != number:
+                continue  # taken over by another spell
+            del self.names[key]
+            for trigram in trigrams(key):
+                keys = self.name_trigrams.get(trigram)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.name_trigrams[trigram]
+        for word in spell_words(spell):
+            numbers = self.words.get(word)
+            if numbers is not None:
+                numbers.discard(number)
+                if not numbers:
+                    del self.words[word]
+
+    def add_many(self, spells: typing.Iterable[Spell]) -> int:
+        count = 0
+        for spell in spells:
+            self.add(spell)
+            count += 1
+        return count
+
+    def get(self, name: str) -> typing.Optional[Spell]:
+        number = self.names.get(index_key(name))
+        return None if number is None else self.spells[number]
+
+    def prefix(self, text: str, limit: int = 10) -> typing.List[Spell]:
+        """
+        Spells with a Russian or English name starting with text, in name order
+        """
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self.names)
+        key = index_key(text)
+        found = []
+        for position in range(bisect.bisect_left(self._sorted_names, key), len(self._sorted_names)):
+            name = self._sorted_names[position]
+            if not name.startswith(key) or len(found) >= limit:
+                break
+            spell = self.spells[self.names[name]]
+            if spell not in found:
+                found.append(spell)
+        return found
+
+    def fuzzy(self, text: str, limit: int = 5,
+              cutoff: float = DEFAULT_FUZZY_CUTOFF) -> typing.List[typing.Tuple[float, Spell]]:
+        """
+        Spells with names similar to text, e.g. with a typo, the most similar first
+        :return: (similarity from cutoff to 1, spell) pairs
+        """
+        query = trigrams(index_key(text))
+        common = collections.Counter()
+        for trigram in query:
+            common.update(self.name_trigrams.get(trigram, ()))
+        scores = {}  # spell number -> best similarity of its names
+        for name, count in common.items():
+            score = 2 * count / (len(query) + len(trigrams(name)))
+            number = self.names[name]
+            if score >= cutoff and score > scores.get(number, 0):
+                scores[number] = score
+        best = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+        return [(score, self.spells[number]) for number, score in best]
+
+    def search(self, text: str) -> typing.List[Spell]:
+        """
+        Spells with every word of text in their names or descriptions
+        """
+        numbers = None
+        for word in WORD_PATTERN.findall(index_key(text)):
+            found = self.words.get(word, set())
+            numbers = set(found) if numbers is None else numbers & found
+        return [self.spells[number] for number in sorted(numbers or ())]
+
+    def resolve(self, name: str, cutoff: float = DEFAULT_FUZZY_CUTOFF) -> typing.Optional[Spell]:
+        """
+        The one spell name most likely means: the exact name, the only name starting with it,
+        or a clear best fuzzy match. None if it is still ambiguous
+        """
+        spell = self.get(name)
+        if spell is not None:
+            return spell
+        by_prefix = self.prefix(name, limit=2)
+        if len(by_prefix) == 1:
+            return by_prefix[0]
+        by_similarity = self.fuzzy(name, limit=2, cutoff=cutoff)
+        if len(by_similarity) == 1 or (len(by_similarity) == 2 and by_similarity[0][0] > by_similarity[1][0]):
+            return by_similarity[0][1]
+        return None
+
+    def import_pages(self, paths: typing.Iterable[str]) -> int:
+        """
+        Adds every spell of saved search result pages, pages with several spells included
+        :param paths: HTML files, directories (all *.html inside) or glob patterns
+        :return: number of spells added
+        """
+        from SiteParser import spells_from_page  # SiteParser uses the index
+        count = 0
+        for path in paths:
+            files = glob.glob(os.path.join(path, '*.html')) if os.path.isdir(path) else glob.glob(path)
+            for file_name in sorted(files):
+                with open(file_name, encoding='utf-8') as f:
+                    count += self.add_many(spells_from_page(f.read()))
+        return count
+
+    def import_cache(self, cache: SpellCache) -> int:
+        return self.add_many(cache.spells())
+
+    def save(self, path: typing.Optional[str] = None):
+        path = path or default_index_path()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for spell in self.spells:
+                f.write(spell_to_json(spell) + '\n')
+
+    @classmethod
+    def load(cls, path: typing.Optional[str] = None) -> 'SpellIndex':
+        """
+        Reads an index written by save, one JSON spell per line. A missing file gives an empty index
+        """
+        path = path or default_index_path()
+        if not os.path.isfile(path):
+            return cls()
+        with open(path, encoding='utf-8') as f:
+            return cls(spell_from_json(line) for line in f if line.strip())
+
+
+def main(argv=None) -> int:
+    argument_parser = argparse.ArgumentParser(description='Build and query the local spell index')
+    argument_parser.add_argument('-i', '--index', default=None, help='index file, see default_index_path()')
+    commands = argument_parser.add_subparsers(dest='command', required=True)
+    import_command = commands.add_parser('import', help='add spells from saved pages and the spell cache')
+    import_command.add_argument('pages', nargs='*', help='saved search result pages, directories or glob patterns')
+    import_command.add_argument('--cache', action='store_true', help='also add every spell of the spell cache')
+    search_command = commands.add_parser('search', help='look a spell up')
+    search_command.add_argument('query')
+    arguments = argument_parser.parse_args(argv)
+
+    index = SpellIndex.load(arguments.index)
+    if arguments.command == 'import':
+        added = index.import_pages(arguments.pages)
+        if arguments.cache:
+            added += index.import_cache(SpellCache())
+        index.save(arguments.index)
+        print(f'{added} spells imported, {len(index)} spells in the index')
+        return 0
+
+    spell = index.resolve(arguments.query)
+    if spell is not None:
+        print(repr(spell))
+        return 0
+    candidates = index.prefix(arguments.query) or [spell for _, spell in index.fuzzy(arguments.query)]
+    candidates = candidates or index.search(arguments.query)
+    if not candidates:
+        print(f'No spells like "{arguments.query}" in the index')
+        return 1
+    print(f'"{arguments.query}" may be: {[spell.name.en_value for spell in candidates]}')
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+from collections import namedtuple
+import sys
+import typing
+
+SpellAttribute = namedtuple('SpellAttribute', ('ru_name', 'ru_value', 'en_name', 'en_value'))
+
+SPELL_FIELDS = ('name', 'level', 'school', 'cast_time', 'range', 'components', 'duration', 'classes', 'source',
+                'higher_levels', 'description')
+
+# attribute names of a spell, shared by every spell parsed from the same kind of page
+SpellSchema = namedtuple('SpellSchema', ('ru_names', 'en_names'))
+schemas = {}  # type: typing.Dict[SpellSchema, SpellSchema]
+
+
+def intern_value(value):
+    # schools, cast times, ranges, sources... repeat across spells, and so do whole descriptions of a spell loaded
+    # twice (from the cache and from a page). Lists (classes and components defaults) are left as they are
+    return sys.intern(value) if type(value) is str else value
+
+
+def attribute_property(position: int) -> property:
+    def attribute(self) -> SpellAttribute:
+        return SpellAttribute(self._schema.ru_names[position], self._ru_values[position],
+                              self._schema.en_names[position], self._en_values[position])
+    return property(attribute)
+
+
+class Spell:
+    """
+    A parsed spell. Behaves like the namedtuple of SpellAttribute it used to be: an attribute per field,
+    iteration, len, indexing, _asdict() and _replace(). Attribute names are kept once in a shared SpellSchema
+    and string values are interned, so a spell holds two tuples of values and nothing else
+    """
+    __slots__ = ('_schema', '_ru_values', '_en_values')
+    _fields = SPELL_FIELDS
+
+    def __init__(self, *attributes, **named_attributes):
+        if len(attributes) + len(named_attributes) != len(SPELL_FIELDS):
+            raise TypeError(f'Spell needs {len(SPELL_FIELDS)} attributes: {SPELL_FIELDS}')
+        attributes = attributes + tuple(named_attributes[name] for name in SPELL_FIELDS[len(attributes):])
+        attributes = [SpellAttribute(*attribute) for attribute in attributes]
+        schema = SpellSchema(ru_names=tuple(sys.intern(attribute.ru_name) for attribute in attributes),
+                             en_names=tuple(sys.intern(attribute.en_name) for attribute in attributes))
+        self._schema = schemas.setdefault(schema, schema)
+        self._ru_values = tuple(intern_value(attribute.ru_value) for attribute in attributes)
+        self._en_values = tuple(intern_value(attribute.en_value) for attribute in attributes)
+
+    def _asdict(self) -> typing.Dict[str, SpellAttribute]:
+        return dict(zip(SPELL_FIELDS, self))
+
+    def _replace(self, **attributes) -> 'Spell':
+        return Spell(**{**self._asdict(), **attributes})
+
+    def __iter__(self) -> typing.Iterator[SpellAttribute]:
+        return map(SpellAttribute, self._schema.ru_names, self._ru_values, self._schema.en_names, self._en_values)
+
+    def __len__(self):
+        return len(SPELL_FIELDS)
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
+
+    def __eq__(self, other):
+        if type(other) is not Spell:
+            return NotImplemented
+        return (self._schema is other._schema and self._ru_values == other._ru_values
+                and self._en_values == other._en_values)
+
+    def __hash__(self):
+        return hash((self._schema, self._ru_values, self._en_values))
+
+    def __reduce__(self):
+        return Spell, tuple(self)
+
+
+for spell_field_position, spell_field in enumerate(SPELL_FIELDS):
+    setattr(Spell, spell_field, attribute_property(spell_field_position))
+
+
+def spell_nice_print(s: Spell) -> str:
+    output_string = f'{s.name.ru_value} ({s.name.en_value})'
+    for value in sorted(s._asdict().values()):
+        if value.ru_name == 'Имя':
+            continue
+        output_string += f'\n\t{value.ru_name.title():25}: {value.ru_value}'
+
+    output_string += '\n'
+    return output_string
+
+
+Spell.__repr__ = spell_nice_print
+
+attributes_translations_dict = {'уровень': 'level',
+                                'школа': 'school',
+                                'время накладывания': 'cast_time',
+                                'дистанция': 'range',
+                                'компоненты': 'components',
+                                'длительность': 'duration',
+                                'классы': 'classes',
+                                'источник': 'source',
+                                'на больших уровнях': 'higher_levels',
+                                'имя': 'name',
+                                'описание': 'description',
+                                }
@@ -0,0 +1,124 @@
+import contextlib
+import io
+import os
+import secrets
+import typing
+from collections import namedtuple
+
+import pdfrw
+
+CachedTemplate = namedtuple('CachedTemplate', ('mtime', 'pdf'))
+TemplateCopy = namedtuple('TemplateCopy', ('trailer', 'pages'))
+
+
+class TemplateCache:
+    """
+    Keeps parsed template PDFs in memory, keyed by path and modification time, so every render
+    does not re-read and re-parse the template file. Templates in the cache are never modified:
+    merge stamps the overlay onto a copy made by stamping_copy
+    """
+
+    def __init__(self):
+        self._templates = {}  # type: typing.Dict[str, CachedTemplate]
+
+    def get(self, template_path) -> pdfrw.PdfReader:
+        """
+        Returns the parsed template, parsing it only if it is not cached yet or the file changed on disk
+        :param template_path: path to the template, or a file-like object (parsed every time, never cached)
+        :return:
+        """
+        if not isinstance(template_path, str):
+            return pdfrw.PdfReader(template_path)
+
+        key = os.path.abspath(template_path)
+        mtime = os.stat(key).st_mtime_ns
+        cached = self._templates.get(key)
+        if cached is None or cached.mtime != mtime:
+            cached = CachedTemplate(mtime=mtime, pdf=pdfrw.PdfReader(key))
+            self._templates[key] = cached
+        return cached.pdf
+
+    def stamping_copy(self, template_path) -> TemplateCopy:
+        """
+        Copies only the objects PageMerge.render changes (the page tree, page resources and their XObject
+        dictionaries). Content streams, fonts and images stay shared with the cached template
+        :param template_path: path to the template, or a file-like object
+        :return: trailer to write and the copied pages in document order
+        """
+        template = self.get(template_path)
+        pages = []
+        root = pdfrw.PdfDict(template.Root)
+        root.Pages = copy_page_tree(template.Root.Pages, None, pages)
+        trailer = pdfrw.PdfDict(template)
+        trailer.Root = root
+        return TemplateCopy(trailer=trailer, pages=pages)
+
+    def clear(self):
+        self._templates.clear()
+
+
+def copy_page_tree(node: pdfrw.PdfDict, parent: typing.Optional[pdfrw.PdfDict],
+                   pages: typing.List[pdfrw.PdfDict]) -> pdfrw.PdfDict:
+    node_copy = node.copy()
+    if parent is not None:
+        node_copy.Parent = parent
+    if node.Type == pdfrw.PdfName.Pages:
+        node_copy.Kids = pdfrw.PdfArray([copy_page_tree(kid, node_copy, pages) for kid in node.Kids])
+        return node_copy
+
+    resources = node.inheritable.Resources
+    if resources is not None:
+        resources = resources.copy()
+        if resources.XObject is not None:
+            resources.XObject = resources.XObject.copy()
+        node_copy.Resources = resources
+    pages.append(node_copy)
+    return node_copy
+
+
+template_cache = TemplateCache()
+
+
+def merge_to(overlay, template_path, sink) -> None:
+    """
+    Stamps the overlay onto a copy of the template and writes the result straight into sink,
+    without building the whole PDF in memory first
+    :param overlay: overlay PDF, as bytes or a binary file object
+    :param template_path: path to the template, or a file-like object
+    :param sink: anything with a write(bytes) method: an open file, BytesIO, socket.makefile('wb')...
+    """
+    template = template_cache.stamping_copy(template_path)
+    if isinstance(overlay, bytes):
+        overlay_pdf = pdfrw.PdfReader(fdata=overlay)
+    else:
+        overlay_pdf = pdfrw.PdfReader(overlay)
+    for page, data in zip(template.pages, overlay_pdf.pages):
+        overlay_page = pdfrw.PageMerge().add(data)[0]
+        pdfrw.PageMerge(page).add(overlay_page).render()
+    pdfrw.PdfWriter().write(sink, template.trailer)
+
+
+def merge(overlay_canvas, template_path) -> io.BytesIO:
+    form = io.BytesIO()
+    merge_to(overlay_canvas, template_path, form)
+    form.seek(0)
+    return form
+
+
+@contextlib.contextmanager
+def replacing_file(path: str) -> typing.Iterator[typing.BinaryIO]:
+    """
+    Binary file to write the result PDF into. It is written next to path and moved over it only when the block
+    succeeds, so a failed render leaves neither an empty nor a truncated PDF, and an older result is kept
+    """
+    temp_path = f'{path}.{secrets.token_hex(4)}.tmp'
+    # created with the usual permissions (unlike mkstemp's owner only), failing if the name is somehow taken
+    file_descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with os.fdopen(file_descriptor, 'wb') as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+        raise